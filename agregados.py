@@ -0,0 +1,157 @@
+"""
+Estatísticas agregadas por escala, atualizadas de forma incremental.
+
+Para cada uma das 31 escalas guarda-se a contagem, a média e a soma dos quadrados dos
+desvios (algoritmo de Welford, na forma de Chan para juntar lotes), um histograma dos
+valores ao centésimo e a contagem por faixa do semáforo (≤33,3 / ≤66,6 / >66,6).
+
+O histograma funciona como um "sketch" de quantis que se pode juntar sem perda: as
+pontuações das escalas têm no máximo duas casas decimais, pelo que a mediana e os
+quartis calculados a partir dele são exatos e o seu tamanho nunca passa de 10 001 entradas.
+
+Dois `AgregadosEscalas` de partições diferentes (folhas, períodos, servidores) juntam-se
+com `mesclar`. Para os reconstruir a partir das linhas da planilha basta `de_matriz` sobre as
+escalas lidas com `codec_respostas.descodificar_linhas`; é o que o cache local faz quando se
+reconstrói (ver `CacheDeRespostas.sincronizar`).
+"""
+import numpy as np
+import pandas as pd
+
+import calculadora_copsoq as motor
+
+LIMITES_SEMAFORO = (33.3, 66.6)
+NOMES_FAIXAS = ("Verde (≤33,3)", "Amarelo (≤66,6)", "Vermelho (>66,6)")
+
+
+class EstatisticaEscala:
+    def __init__(self):
+        self.contagem = 0
+        self.media = 0.0
+        self.m2 = 0.0
+        self.histograma = {}  # centésimos -> contagem
+        self.faixas = [0, 0, 0]
+
+    @classmethod
+    def de_valores(cls, valores):
+        """Cria a estatística de um vetor de valores (NaN = sem resposta)."""
+        estatistica = cls()
+        valores = np.asarray(valores, dtype=float)
+        valores = valores[~np.isnan(valores)]
+        if valores.size == 0:
+            return estatistica
+        estatistica.contagem = int(valores.size)
+        estatistica.media = float(valores.mean())
+        estatistica.m2 = float(((valores - estatistica.media) ** 2).sum())
+        centesimos, contagens = np.unique(np.rint(valores * 100).astype(np.int64), return_counts=True)
+        estatistica.histograma = dict(zip(centesimos.tolist(), contagens.tolist()))
+        estatistica.faixas = [
+            int((valores <= LIMITES_SEMAFORO[0]).sum()),
+            int(((valores > LIMITES_SEMAFORO[0]) & (valores <= LIMITES_SEMAFORO[1])).sum()),
+            int((valores > LIMITES_SEMAFORO[1]).sum()),
+        ]
+        return estatistica
+
+    def mesclar(self, outra):
+        """Junta a estatística de outra partição a esta (in-place)."""
+        if outra.contagem == 0:
+            return self
+        total = self.contagem + outra.contagem
+        delta = outra.media - self.media
+        self.media += delta * outra.contagem / total
+        self.m2 += outra.m2 + delta * delta * self.contagem * outra.contagem / total
+        self.contagem = total
+        for centesimo, contagem in outra.histograma.items():
+            self.histograma[centesimo] = self.histograma.get(centesimo, 0) + contagem
+        self.faixas = [a + b for a, b in zip(self.faixas, outra.faixas)]
+        return self
+
+    @property
+    def variancia(self):
+        return self.m2 / (self.contagem - 1) if self.contagem > 1 else float("nan")
+
+    @property
+    def desvio_padrao(self):
+        return self.variancia ** 0.5
+
+    def quantil(self, q):
+        """Quantil com interpolação linear (o mesmo critério de `pandas.Series.quantile`)."""
+        if self.contagem == 0:
+            return float("nan")
+        centesimos = sorted(self.histograma)
+        acumulado = np.cumsum([self.histograma[c] for c in centesimos])
+        posicao = q * (self.contagem - 1)
+        inferior = int(np.floor(posicao))
+        superior = min(inferior + 1, self.contagem - 1)
+        valor_inferior = centesimos[int(np.searchsorted(acumulado, inferior, side="right"))] / 100
+        valor_superior = centesimos[int(np.searchsorted(acumulado, superior, side="right"))] / 100
+        return valor_inferior + (valor_superior - valor_inferior) * (posicao - inferior)
+
+    def para_dict(self):
+        return {
+            "contagem": self.contagem, "media": self.media, "m2": self.m2,
+            "histograma": {str(c): n for c, n in self.histograma.items()}, "faixas": list(self.faixas),
+        }
+
+    @classmethod
+    def de_dict(cls, dados):
+        estatistica = cls()
+        estatistica.contagem = dados["contagem"]
+        estatistica.media = dados["media"]
+        estatistica.m2 = dados["m2"]
+        estatistica.histograma = {int(c): n for c, n in dados["histograma"].items()}
+        estatistica.faixas = list(dados["faixas"])
+        return estatistica
+
+
+class AgregadosEscalas:
+    def __init__(self):
+        self.total_linhas = 0
+        self.escalas = {nome: EstatisticaEscala() for nome in motor.definicao_escalas}
+
+    @classmethod
+    def de_matriz(cls, matriz):
+        """Cria os agregados de uma matriz N×31 de pontuações de escala (pela ordem de `definicao_escalas`)."""
+        matriz = np.asarray(matriz, dtype=float).reshape(-1, len(motor.definicao_escalas))
+        agregados = cls()
+        agregados.total_linhas = matriz.shape[0]
+        for coluna, nome in enumerate(motor.definicao_escalas):
+            agregados.escalas[nome] = EstatisticaEscala.de_valores(matriz[:, coluna])
+        return agregados
+
+    def mesclar(self, outros):
+        """Junta os agregados de outra partição a estes (in-place)."""
+        self.total_linhas += outros.total_linhas
+        for nome, estatistica in outros.escalas.items():
+            self.escalas.setdefault(nome, EstatisticaEscala()).mesclar(estatistica)
+        return self
+
+    def resumo(self):
+        """Tabela com contagem, média, desvio padrão, quartis e distribuição pelo semáforo de cada escala."""
+        linhas = []
+        for nome, estatistica in self.escalas.items():
+            if estatistica.contagem == 0:
+                continue
+            linha = {
+                "Escala": nome,
+                "Respostas": estatistica.contagem,
+                "Pontuação Média": estatistica.media,
+                "Desvio Padrão": estatistica.desvio_padrao,
+                "Q1": estatistica.quantil(0.25),
+                "Mediana": estatistica.quantil(0.5),
+                "Q3": estatistica.quantil(0.75),
+            }
+            for nome_faixa, contagem in zip(NOMES_FAIXAS, estatistica.faixas):
+                linha[nome_faixa] = 100 * contagem / estatistica.contagem
+            linhas.append(linha)
+        return pd.DataFrame(linhas)
+
+    def para_dict(self):
+        return {"total_linhas": self.total_linhas, "escalas": {n: e.para_dict() for n, e in self.escalas.items()}}
+
+    @classmethod
+    def de_dict(cls, dados):
+        agregados = cls()
+        agregados.total_linhas = dados["total_linhas"]
+        for nome, estatistica in dados["escalas"].items():
+            agregados.escalas[nome] = EstatisticaEscala.de_dict(estatistica)
+        return agregados
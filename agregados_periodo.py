@@ -0,0 +1,204 @@
+"""
+Agregados por período de tempo (dia, semana e mês), somáveis, para filtrar e comparar
+resultados sem voltar a ler as respostas.
+
+Para cada período e escala guarda-se a contagem, a soma, a soma dos quadrados e a contagem
+por faixa do semáforo. São tudo somas, pelo que juntar dias, meses ou fragmentos é somar
+linhas e a média e o desvio padrão saem no fim. Cada período tem ainda uma linha com a
+escala `ESCALA_RESPOSTAS`, onde a contagem é o número de respostas recebidas.
+
+As chaves dos períodos são texto ordenável: "AAAA-MM-DD" para o dia, a data da
+segunda-feira para a semana e "AAAA-MM" para o mês. Linhas com um Timestamp que não comece
+por uma data válida ficam de fora (continuam nos `agregados.AgregadosEscalas` gerais).
+
+Uma consulta por intervalo [inicio, fim) usa os meses completos e só os dias soltos das pontas
+(ver `intervalos_de_consulta`), e o tamanho da leitura não depende do número de respostas.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+import calculadora_copsoq as motor
+from agregados import LIMITES_SEMAFORO, NOMES_FAIXAS
+
+GRANULARIDADES = ("dia", "semana", "mes")
+ESCALA_RESPOSTAS = -1
+# Colunas de cada linha (granularidade, período, escala) da tabela de agregados
+COLUNAS_SOMAS = ("contagem", "soma", "soma_quadrados", "verde", "amarelo", "vermelho")
+
+
+def _dias(timestamps):
+    """Vetor `datetime64[D]` com a data de cada Timestamp (NaT quando não começa por uma data válida)."""
+    datas = pd.to_datetime(pd.Series(list(timestamps), dtype=object).astype(str).str[:10], format="%Y-%m-%d", errors="coerce")
+    return datas.to_numpy(dtype="datetime64[D]")
+
+
+def _chaves(dias, granularidade):
+    if granularidade == "dia":
+        return np.datetime_as_string(dias, unit="D")
+    if granularidade == "semana":
+        # 1970-01-01 foi uma quinta-feira
+        return np.datetime_as_string(dias - ((dias.astype(np.int64) + 3) % 7).astype("timedelta64[D]"), unit="D")
+    if granularidade == "mes":
+        return np.datetime_as_string(dias.astype("datetime64[M]"), unit="M")
+    raise ValueError(f"Granularidade desconhecida: {granularidade!r}")
+
+
+def chaves_periodo(timestamps, granularidade):
+    """Chave do período de cada Timestamp (texto "AAAA-MM-DD HH:MM:SS"); "" quando não tem data válida."""
+    dias = _dias(timestamps)
+    return np.where(np.isnat(dias), "", _chaves(dias, granularidade)).astype(object)
+
+
+def somas_por_periodo(timestamps, escalas):
+    """
+    Linhas (granularidade, período, escala, contagem, soma, soma_quadrados, verde, amarelo,
+    vermelho) de um lote de respostas: `escalas` é a matriz N×31 (NaN = sem resposta) e a
+    escala é o índice da coluna em `definicao_escalas`.
+    """
+    dias = _dias(timestamps)
+    validas = ~np.isnat(dias)
+    if not validas.any():
+        return []
+    # Ordenadas por data, as linhas de cada dia, semana e mês ficam seguidas e somam-se com `reduceat`
+    ordem = np.argsort(dias[validas], kind="stable")
+    dias = dias[validas][ordem]
+    escalas = np.asarray(escalas, dtype=float).reshape(-1, len(motor.definicao_escalas))[np.flatnonzero(validas)[ordem]]
+    presentes = ~np.isnan(escalas)
+    valores = np.where(presentes, escalas, 0.0)
+    del escalas
+
+    grupos = {}
+    for granularidade in GRANULARIDADES:
+        chaves = _chaves(dias, granularidade)
+        inicios = np.flatnonzero(np.r_[True, chaves[1:] != chaves[:-1]])
+        grupos[granularidade] = (inicios, chaves[inicios])
+    somas = {g: np.empty((len(inicios), valores.shape[1], len(COLUNAS_SOMAS))) for g, (inicios, _) in grupos.items()}
+    quantidades = (
+        lambda: presentes,
+        lambda: valores,
+        lambda: valores ** 2,
+        lambda: presentes & (valores <= LIMITES_SEMAFORO[0]),
+        lambda: (valores > LIMITES_SEMAFORO[0]) & (valores <= LIMITES_SEMAFORO[1]),
+        lambda: valores > LIMITES_SEMAFORO[1],
+    )
+    for coluna, quantidade in enumerate(quantidades):
+        # Uma quantidade de cada vez, para não ter as seis matrizes N×31 em memória
+        matriz = quantidade().astype(float)
+        for granularidade, (inicios, _) in grupos.items():
+            somas[granularidade][:, :, coluna] = np.add.reduceat(matriz, inicios, axis=0)
+
+    linhas = []
+    for granularidade, (inicios, periodos) in grupos.items():
+        respostas = np.diff(np.r_[inicios, len(dias)])
+        for p, periodo in enumerate(periodos.tolist()):
+            linhas.append((granularidade, periodo, ESCALA_RESPOSTAS, int(respostas[p]), 0.0, 0.0, 0, 0, 0))
+            for escala in np.flatnonzero(somas[granularidade][p, :, 0]).tolist():
+                contagem, soma, quadrados, verde, amarelo, vermelho = somas[granularidade][p, escala].tolist()
+                linhas.append((granularidade, periodo, escala, int(contagem), soma, quadrados, int(verde), int(amarelo), int(vermelho)))
+    return linhas
+
+
+def _mes_seguinte(mes):
+    ano, numero = int(mes[:4]), int(mes[5:7])
+    return f"{ano + 1}-01" if numero == 12 else f"{ano}-{numero + 1:02d}"
+
+
+def intervalos_de_consulta(inicio=None, fim=None):
+    """
+    Decompõe o intervalo de datas [inicio, fim) ("AAAA-MM-DD"; None = sem limite) em
+    intervalos de chaves (granularidade, desde, até), com `até` exclusivo: os meses
+    completos e os dias que sobram nas pontas.
+    """
+    desde_mes = None if inicio is None else (inicio[:7] if inicio.endswith("-01") else _mes_seguinte(inicio[:7]))
+    ate_mes = None if fim is None else fim[:7]
+    if desde_mes is not None and ate_mes is not None and desde_mes >= ate_mes:
+        return [("dia", inicio, fim)]
+    intervalos = [("mes", desde_mes, ate_mes)]
+    if inicio is not None and not inicio.endswith("-01"):
+        intervalos.append(("dia", inicio, f"{desde_mes}-01"))
+    if fim is not None and not fim.endswith("-01"):
+        intervalos.append(("dia", f"{ate_mes}-01", fim))
+    return intervalos
+
+
+def limites_da_serie(granularidade, inicio=None, fim=None):
+    """Chaves (primeira, última) dos períodos que tocam o intervalo [inicio, fim); None = sem limite."""
+    ultimo_dia = None if fim is None else f"{date.fromisoformat(fim) - timedelta(days=1):%Y-%m-%d}"
+    return tuple(
+        None if data is None else chaves_periodo([data], granularidade)[0]
+        for data in (inicio, ultimo_dia)
+    )
+
+
+class TotaisPeriodo:
+    """Somas de um intervalo de tempo: o número de respostas e, por escala, as colunas de `COLUNAS_SOMAS`."""
+
+    def __init__(self):
+        self.respostas = 0
+        self.somas = np.zeros((len(motor.definicao_escalas), len(COLUNAS_SOMAS)))
+
+    @classmethod
+    def de_registos(cls, registos):
+        """Cria os totais de linhas (escala, contagem, soma, soma_quadrados, verde, amarelo, vermelho)."""
+        totais = cls()
+        for escala, *somas in registos:
+            if escala == ESCALA_RESPOSTAS:
+                totais.respostas += int(somas[0])
+            else:
+                totais.somas[escala] += somas
+        return totais
+
+    def mesclar(self, outros):
+        """Junta os totais de outra partição a estes (in-place)."""
+        self.respostas += outros.respostas
+        self.somas += outros.somas
+        return self
+
+    def resumo(self):
+        """Tabela com contagem, média, desvio padrão e distribuição pelo semáforo de cada escala."""
+        linhas = []
+        for nome, (contagem, soma, quadrados, *faixas) in zip(motor.definicao_escalas, self.somas.tolist()):
+            if contagem == 0:
+                continue
+            media = soma / contagem
+            variancia = max(quadrados - soma * media, 0.0) / (contagem - 1) if contagem > 1 else float("nan")
+            linha = {
+                "Escala": nome,
+                "Respostas": int(contagem),
+                "Pontuação Média": media,
+                "Desvio Padrão": variancia ** 0.5,
+            }
+            for nome_faixa, n in zip(NOMES_FAIXAS, faixas):
+                linha[nome_faixa] = 100 * n / contagem
+            linhas.append(linha)
+        return pd.DataFrame(linhas)
+
+
+def comparar(totais_a, totais_b):
+    """Médias de cada escala em dois intervalos (A e B) e a diferença B − A."""
+    colunas = ["Escala", "Respostas", "Pontuação Média"]
+    resumo_a = totais_a.resumo().reindex(columns=colunas)
+    resumo_b = totais_b.resumo().reindex(columns=colunas)
+    tabela = resumo_a.merge(resumo_b, on="Escala", how="outer", suffixes=(" (A)", " (B)"))
+    tabela["Diferença"] = tabela["Pontuação Média (B)"] - tabela["Pontuação Média (A)"]
+    ordem = {nome: i for i, nome in enumerate(motor.definicao_escalas)}
+    return tabela.sort_values("Escala", key=lambda s: s.map(ordem)).reset_index(drop=True)
+
+
+def tabela_de_tendencia(registos):
+    """
+    Série temporal a partir de linhas (período, escala, contagem, soma), que podem repetir o
+    período (por exemplo, de fragmentos diferentes). Devolve um DataFrame com as colunas
+    Período, Escala, Respostas e Pontuação Média, por ordem de período.
+    """
+    df = pd.DataFrame(list(registos), columns=["Período", "escala", "Respostas", "soma"])
+    df = df[df["escala"] != ESCALA_RESPOSTAS].groupby(["Período", "escala"], as_index=False)[["Respostas", "soma"]].sum()
+    nomes = list(motor.definicao_escalas)
+    return pd.DataFrame({
+        "Período": df["Período"],
+        "Escala": [nomes[escala] for escala in df["escala"]],
+        "Respostas": df["Respostas"].astype(int),
+        "Pontuação Média": df["soma"] / df["Respostas"],
+    }).reset_index(drop=True)
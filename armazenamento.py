@@ -0,0 +1,265 @@
+"""
+Armazenamento das respostas: onde a fila grava as submissões e de onde o cache as lê.
+
+Um armazenamento é um conjunto de "fragmentos" e cada fragmento expõe a API de uma worksheet
+do gspread (a mesma que `fila_submissoes` e `cache_respostas` já usam). Há dois tipos:
+- `ArmazenamentoPlanilha`: a Planilha Google; sem critério de fragmentação é o comportamento
+  original (tudo na `sheet1` de `Resultados_COPSOQ`);
+- `ArmazenamentoSQLite`: um ficheiro local, útil em testes e para correr sem credenciais.
+
+Com um critério ("mes" ou "campanha"), cada submissão vai para o fragmento que o encaminhador
+(`fragmento_para`) lhe atribui: uma worksheet "Respostas 2026-10" na mesma planilha ou, com
+`planilha_por_fragmento`, uma planilha própria ("Resultados_COPSOQ 2026-10"). Só planilhas
+separadas afastam o limite de células, que conta para todas as folhas de uma planilha.
+A campanha vem do URL (`?campanha=`), por isso só as campanhas configuradas (`campanhas`)
+têm fragmento próprio; qualquer outro valor vai para `CAMPANHA_PADRAO`.
+O fragmento principal ("") é a `sheet1` original e continua a ser lido.
+"""
+import abc
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import date
+
+import codec_respostas as codec
+
+FRAGMENTO_PRINCIPAL = ""
+CRITERIOS = (None, "mes", "campanha")
+CAMPANHA_PADRAO = "geral"
+PREFIXO_FOLHA = "Respostas "
+
+
+def normalizar_campanha(campanha):
+    """Nome de campanha utilizável como título de folha (sem []:*?/\\, até 50 caracteres)."""
+    texto = re.sub(r"[\[\]:*?/\\]+", "-", str(campanha or "")).strip(" -")
+    return texto[:50] or CAMPANHA_PADRAO
+
+
+def _mes_anterior(hoje=None):
+    hoje = hoje or date.today()
+    return f"{hoje.year - 1}-12" if hoje.month == 1 else f"{hoje.year}-{hoje.month - 1:02d}"
+
+
+class Armazenamento(abc.ABC):
+    """Base comum: o encaminhamento das submissões para os fragmentos."""
+
+    def __init__(self, criterio=None, campanhas=()):
+        """`campanhas` são as campanhas aceites com o critério "campanha"; as outras vão para `CAMPANHA_PADRAO`."""
+        if criterio not in CRITERIOS:
+            raise ValueError(f"Critério de fragmentação desconhecido: {criterio!r}")
+        self.criterio = criterio
+        self.campanhas = frozenset(normalizar_campanha(c) for c in campanhas) | {CAMPANHA_PADRAO}
+
+    def fragmento_para(self, linha, campanha=None):
+        """Fragmento onde deve ficar a linha (compacta, com o Timestamp na primeira posição)."""
+        if self.criterio == "mes":
+            return str(linha[0])[:7]
+        if self.criterio == "campanha":
+            campanha = normalizar_campanha(campanha)
+            return campanha if campanha in self.campanhas else CAMPANHA_PADRAO
+        return FRAGMENTO_PRINCIPAL
+
+    def fragmento_fechado(self, fragmento):
+        """
+        Indica se o fragmento já não recebe submissões: por mês, os anteriores ao mês passado
+        (o mês passado ainda pode receber linhas que estavam na fila na viragem do mês).
+        """
+        if self.criterio != "mes" or fragmento == FRAGMENTO_PRINCIPAL:
+            return False
+        return fragmento < _mes_anterior()
+
+    @abc.abstractmethod
+    def fragmentos(self):
+        """Lista dos fragmentos existentes, começando pelo principal."""
+
+    @abc.abstractmethod
+    def abrir(self, fragmento):
+        """Devolve a folha do fragmento (com a API de uma worksheet), criando-a se for preciso."""
+
+
+class ArmazenamentoPlanilha(Armazenamento):
+    def __init__(self, conectar, nome_planilha, criterio=None, planilha_por_fragmento=False, pasta_id=None, campanhas=()):
+        """
+        `conectar` devolve o cliente gspread (é chamado sempre que preciso, para aproveitar a
+        cache do Streamlit); `pasta_id` é a pasta do Drive onde criar as planilhas dos fragmentos.
+        """
+        super().__init__(criterio, campanhas)
+        self._conectar = conectar
+        self.nome_planilha = nome_planilha
+        self.planilha_por_fragmento = planilha_por_fragmento
+        self.pasta_id = pasta_id
+        self._lock = threading.Lock()
+        self._cliente = None
+        self._planilhas = {}
+
+    def _abrir_planilha(self, titulo, criar=False):
+        import gspread
+
+        gc = self._conectar()
+        with self._lock:
+            if gc is not self._cliente:
+                self._cliente, self._planilhas = gc, {}
+            if titulo not in self._planilhas:
+                try:
+                    self._planilhas[titulo] = gc.open(titulo)
+                except gspread.exceptions.SpreadsheetNotFound:
+                    if not criar:
+                        raise
+                    self._planilhas[titulo] = gc.create(titulo, folder_id=self.pasta_id)
+            return self._planilhas[titulo]
+
+    def fragmentos(self):
+        if self.criterio is None:
+            return [FRAGMENTO_PRINCIPAL]
+        if self.planilha_por_fragmento:
+            prefixo = f"{self.nome_planilha} "
+            titulos = [f["name"] for f in self._conectar().list_spreadsheet_files(folder_id=self.pasta_id)]
+        else:
+            prefixo = PREFIXO_FOLHA
+            titulos = [folha.title for folha in self._abrir_planilha(self.nome_planilha).worksheets()]
+        return [FRAGMENTO_PRINCIPAL] + sorted(t[len(prefixo):] for t in titulos if t.startswith(prefixo))
+
+    def abrir(self, fragmento):
+        import gspread
+
+        if fragmento == FRAGMENTO_PRINCIPAL:
+            return self._abrir_planilha(self.nome_planilha).sheet1
+        if self.planilha_por_fragmento:
+            return self._abrir_planilha(f"{self.nome_planilha} {fragmento}", criar=True).sheet1
+        planilha = self._abrir_planilha(self.nome_planilha)
+        try:
+            return planilha.worksheet(f"{PREFIXO_FOLHA}{fragmento}")
+        except gspread.exceptions.WorksheetNotFound:
+            return planilha.add_worksheet(f"{PREFIXO_FOLHA}{fragmento}", rows=1000, cols=len(codec.cabecalho_compacto))
+
+
+class FolhaSQLite:
+    """Um fragmento do `ArmazenamentoSQLite`, com a parte da API de worksheet usada pela fila e pelo cache."""
+
+    def __init__(self, armazenamento, fragmento):
+        self._armazenamento = armazenamento
+        self.title = fragmento
+
+    def _linhas(self, inicio=1, fim=None):
+        consulta = "SELECT numero, valores FROM linhas WHERE fragmento = ? AND numero >= ?"
+        parametros = [self.title, inicio]
+        if fim is not None:
+            consulta += " AND numero <= ?"
+            parametros.append(fim)
+        with self._armazenamento._lock:
+            registos = self._armazenamento._conexao.execute(consulta + " ORDER BY numero", parametros).fetchall()
+        return [(numero, json.loads(valores)) for numero, valores in registos]
+
+    def row_values(self, linha):
+        registos = self._linhas(linha, linha)
+        return codec.sem_vazios_finais(registos[0][1]) if registos else []
+
+    def col_values(self, coluna):
+        valores, seguinte = [], 1
+        for numero, linha in self._linhas():
+            valores.extend([""] * (numero - seguinte))
+            valores.append(linha[coluna - 1] if coluna <= len(linha) else "")
+            seguinte = numero + 1
+        return codec.sem_vazios_finais(valores)
+
+    def get(self, range_name=None, **_):
+        """Aceita intervalos como "A2:DM" ou "A2:DM500" (sempre a partir da coluna A)."""
+        inicio, colunas, fim = re.fullmatch(r"A(\d*)(?::([A-Z]+)(\d*))?", range_name or "A1:ZZZ").groups()
+        largura = None
+        if colunas:
+            largura = 0
+            for letra in colunas:
+                largura = largura * 26 + ord(letra) - ord("A") + 1
+        inicio = int(inicio or 1)
+        resultado, seguinte = [], inicio
+        for numero, linha in self._linhas(inicio, int(fim) if fim else None):
+            resultado.extend([] for _ in range(numero - seguinte))
+            resultado.append(codec.sem_vazios_finais(linha[:largura]))
+            seguinte = numero + 1
+        return resultado
+
+    def update(self, values=None, range_name=None, **_):
+        """Substitui linhas inteiras a partir da linha de `range_name` (ex.: "A1")."""
+        inicio = int(re.fullmatch(r"A(\d+)", range_name or "A1").group(1))
+        with self._armazenamento._lock:
+            self._armazenamento._conexao.executemany(
+                "INSERT OR REPLACE INTO linhas (fragmento, numero, valores) VALUES (?, ?, ?)",
+                [(self.title, inicio + i, json.dumps([codec.formatar_celula(v) for v in linha], ensure_ascii=False)) for i, linha in enumerate(values)],
+            )
+        return {}
+
+    def append_rows(self, values, **_):
+        conexao = self._armazenamento._conexao
+        with self._armazenamento._lock:
+            conexao.execute("BEGIN IMMEDIATE")
+            try:
+                ultima = conexao.execute("SELECT MAX(numero) FROM linhas WHERE fragmento = ?", (self.title,)).fetchone()[0] or 0
+                conexao.executemany(
+                    "INSERT INTO linhas (fragmento, numero, valores) VALUES (?, ?, ?)",
+                    [(self.title, ultima + 1 + i, json.dumps([codec.formatar_celula(v) for v in linha], ensure_ascii=False)) for i, linha in enumerate(values)],
+                )
+                conexao.execute("COMMIT")
+            except BaseException:
+                conexao.execute("ROLLBACK")
+                raise
+        return {}
+
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], **kwargs)
+
+
+class ArmazenamentoSQLite(Armazenamento):
+    def __init__(self, caminho, criterio=None, campanhas=()):
+        super().__init__(criterio, campanhas)
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS linhas ("
+            " fragmento TEXT NOT NULL,"
+            " numero INTEGER NOT NULL,"
+            " valores TEXT NOT NULL,"
+            " PRIMARY KEY (fragmento, numero)) WITHOUT ROWID"
+        )
+
+    def fragmentos(self):
+        with self._lock:
+            existentes = [f for (f,) in self._conexao.execute("SELECT DISTINCT fragmento FROM linhas ORDER BY fragmento")]
+        return [FRAGMENTO_PRINCIPAL] + [f for f in existentes if f != FRAGMENTO_PRINCIPAL]
+
+    def abrir(self, fragmento):
+        return FolhaSQLite(self, fragmento)
+
+    def fechar(self):
+        with self._lock:
+            self._conexao.close()
+
+
+def criar_armazenamento(configuracao, conectar, nome_planilha, diretorio_dados):
+    """
+    Cria o armazenamento descrito em `configuracao` (a secção [armazenamento] dos Secrets):
+    `tipo` ("planilha" ou "sqlite"), `criterio` ("mes", "campanha" ou nenhum),
+    `campanhas` (lista das campanhas aceites), `planilha_por_fragmento`, `pasta_id` e, para o
+    SQLite, `caminho`.
+    """
+    tipo = configuracao.get("tipo", "planilha")
+    criterio = configuracao.get("criterio") or None
+    campanhas = list(configuracao.get("campanhas") or ())
+    if tipo == "sqlite":
+        caminho = configuracao.get("caminho") or os.path.join(diretorio_dados, "respostas.sqlite3")
+        return ArmazenamentoSQLite(caminho, criterio, campanhas)
+    if tipo == "planilha":
+        return ArmazenamentoPlanilha(
+            conectar,
+            configuracao.get("nome_planilha", nome_planilha),
+            criterio,
+            planilha_por_fragmento=bool(configuracao.get("planilha_por_fragmento", False)),
+            pasta_id=configuracao.get("pasta_id"),
+            campanhas=campanhas,
+        )
+    raise ValueError(f"Tipo de armazenamento desconhecido: {tipo!r}")
@@ -0,0 +1,137 @@
+"""
+Mede o arranque a frio, o custo de cada rerun e o de um questionário completo.
+
+Cada medição corre num processo Python novo, com o `AppTest` do Streamlit:
+- "arranque a frio": a primeira execução de app.py (inclui as importações dos módulos);
+- "rerun": as execuções seguintes, cada uma depois de responder a uma pergunta;
+- "questionário completo": um respondente simulado responde às 84 perguntas e finaliza.
+  Conta as execuções do script (uma por clique numa pergunta fora de um formulário e uma
+  por botão) e o tempo de CPU gasto no total.
+Regista também quais das bibliotecas pesadas ficaram carregadas depois de abrir o questionário.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/arranque.py --repeticoes 5 --reruns 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRETORIO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+MODULOS_PESADOS = ("gspread", "pandas", "plotly.express", "fpdf", "requests", "pyarrow")
+
+
+def _responder_questionario(app):
+    """Responde a todas as perguntas e finaliza; devolve o número de execuções do script."""
+    execucoes = 0
+    for _ in range(200):
+        if any("Diagnóstico concluído" in sucesso.value for sucesso in app.success):
+            return execucoes
+        # Depois de cada execução os elementos são outros, pelo que a lista é lida de novo
+        por_responder = [i for i, radio in enumerate(app.radio) if radio.value is None]
+        for i in por_responder:
+            radio = app.radio[i]
+            radio.set_value("Às vezes")
+            if not radio.proto.form_id:
+                app.run()
+                execucoes += 1
+        botoes = {botao.label: botao for botao in app.button}
+        botao = next((b for rotulo, b in botoes.items() if "Finalizar" in rotulo), None) or next((b for rotulo, b in botoes.items() if "Próximo" in rotulo), None)
+        if botao is None:
+            # O botão ainda não apareceu: o respondente tem de interagir mais uma vez com a página
+            app.run()
+        else:
+            botao.click().run()
+        execucoes += 1
+    raise RuntimeError("O questionário simulado não chegou ao fim")
+
+
+def _medir_no_processo(reruns):
+    """Corre dentro do processo filho e imprime o resultado em JSON."""
+    import tempfile
+    import time
+
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["COPSOQ_DIRETORIO_DADOS"] = tempfile.mkdtemp(prefix="copsoq_arranque_")
+    app = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=120)
+    app.secrets["armazenamento"] = {"tipo": "sqlite"}
+    inicio = time.perf_counter()
+    app.run()
+    arranque = time.perf_counter() - inicio
+    carregados = [modulo for modulo in MODULOS_PESADOS if modulo in sys.modules]
+
+    tempos = []
+    opcoes = ("Nunca", "Raramente", "Às vezes", "Frequentemente", "Sempre")
+    for i in range(reruns):
+        radio = app.radio[i % len(app.radio)]
+        radio.set_value(opcoes[i % len(opcoes)])
+        inicio = time.perf_counter()
+        app.run()
+        tempos.append(time.perf_counter() - inicio)
+
+    questionario = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=120)
+    questionario.secrets["armazenamento"] = {"tipo": "sqlite"}
+    questionario.run()
+    cpu = time.process_time()
+    execucoes = 1 + _responder_questionario(questionario)
+    cpu = time.process_time() - cpu
+
+    print(json.dumps({"arranque": arranque, "reruns": tempos, "modulos_pesados": carregados, "questionario": [execucoes, cpu]}))
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=5, help="processos novos a lançar")
+    parser.add_argument("--reruns", type=int, default=20, help="reruns medidos em cada processo")
+    parser.add_argument("--rotulo", default=None)
+    parser.add_argument("--filho", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argumentos)
+
+    if args.filho:
+        _medir_no_processo(args.reruns)
+        return 0
+
+    arranques, reruns, modulos, questionarios = [], [], set(), []
+    for _ in range(args.repeticoes):
+        saida = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--filho", "--reruns", str(args.reruns)],
+            capture_output=True, text=True, check=True, cwd=RAIZ,
+        ).stdout
+        medicao = json.loads(saida.strip().splitlines()[-1])
+        arranques.append(medicao["arranque"])
+        reruns.extend(medicao["reruns"])
+        modulos.update(medicao["modulos_pesados"])
+        questionarios.append(medicao["questionario"])
+
+    resultado = {
+        "arranque_mediana_s": statistics.median(arranques),
+        "rerun_mediana_s": statistics.median(reruns),
+        "rerun_p95_s": sorted(reruns)[int(0.95 * (len(reruns) - 1))],
+        "modulos_pesados_carregados": sorted(modulos),
+        "questionario_execucoes": statistics.median(execucoes for execucoes, _ in questionarios),
+        "questionario_cpu_s": statistics.median(cpu for _, cpu in questionarios),
+    }
+    print(f"Arranque a frio (mediana): {resultado['arranque_mediana_s'] * 1000:.0f} ms")
+    print(f"Rerun (mediana / p95):     {resultado['rerun_mediana_s'] * 1000:.1f} ms / {resultado['rerun_p95_s'] * 1000:.1f} ms")
+    print(f"Questionário completo:     {resultado['questionario_execucoes']:.0f} execuções do script, {resultado['questionario_cpu_s'] * 1000:.0f} ms de CPU")
+    print(f"Bibliotecas pesadas carregadas no questionário: {', '.join(resultado['modulos_pesados_carregados']) or 'nenhuma'}")
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from executar_benchmarks import rotulo_da_versao
+
+    rotulo = args.rotulo or rotulo_da_versao()
+    os.makedirs(DIRETORIO_RESULTADOS, exist_ok=True)
+    caminho = os.path.join(DIRETORIO_RESULTADOS, f"arranque_{rotulo}.json")
+    with open(caminho, "w", encoding="utf-8") as ficheiro:
+        json.dump({"rotulo": rotulo, "data": datetime.now().isoformat(timespec="seconds"), **resultado}, ficheiro, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {caminho}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,320 @@
+"""
+Teste de carga: N respondentes em simultâneo a preencher e submeter o questionário, contra a
+planilha falsa com quotas por minuto e latência (`planilha_falsa.LimitadorDeQuota`).
+
+Cada respondente é uma thread que passa pelas 8 secções (com um tempo de resposta sorteado
+em cada uma), calcula o diagnóstico e submete, pelo mesmo caminho da aplicação:
+- modo "fila" (o atual): a submissão vai para a `FilaDeSubmissoes` e o descarregador envia-a
+  para o armazenamento em lotes;
+- modo "direto": `append_row` síncrono na planilha, como antes da fila; uma submissão que
+  falhe em todas as tentativas perde-se.
+Com `--administradores`, há também painéis do consultor abertos a sincronizar o cache e a
+calcular o resumo (a sincronização é partilhada durante um minuto, como o `st.cache_data`
+da aplicação).
+
+No fim, espera que a fila esvazie e compara as submissões aceites com as que estão na
+planilha. Relata débito, latência da submissão (p50/p99), latência até a linha estar na
+planilha, erros e repetições, submissões perdidas e uso das quotas. Com `--acelerar`, todos
+os tempos (quotas, latências, respostas, esperas) correm mais depressa na mesma proporção e
+são relatados em tempo simulado; o trabalho local (SQLite, cálculo) não é acelerado, pelo
+que fica sobrestimado nesse fator.
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/carga.py --respondentes 200 --acelerar 20
+    python benchmarks/carga.py --respondentes 200 --acelerar 20 --modo direto --tentativas 3
+    python benchmarks/carga.py --respondentes 500 --acelerar 20 --administradores 5
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import calculadora_copsoq as motor  # noqa: E402
+import catalogo_perguntas as catalogo  # noqa: E402
+import codec_respostas as codec  # noqa: E402
+from armazenamento import ArmazenamentoPlanilha  # noqa: E402
+from cache_respostas import CacheFragmentado  # noqa: E402
+from dados_sinteticos import gerar_respostas  # noqa: E402
+from fila_submissoes import FilaDeSubmissoes, garantir_cabecalho  # noqa: E402
+from planilha_falsa import ClienteFalso, LimitadorDeQuota  # noqa: E402
+
+NOME_PLANILHA = "Resultados_COPSOQ"
+DIRETORIO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+
+
+def percentil(valores, q):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+class Registo:
+    """Medições recolhidas pelas threads do teste."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias_submissao = []
+        self.submetidas = {}  # id -> instante da submissão
+        self.gravadas = {}  # id -> instante em que a linha chegou à planilha
+        self.falhas_submissao = 0
+        self.tentativas_extra = 0
+        self.envios = 0
+        self.envios_falhados = 0
+        self.latencias_admin = []
+        self.erros_admin = 0
+
+    def adicionar(self, atributo, valor):
+        with self._lock:
+            getattr(self, atributo).append(valor)
+
+    def somar(self, atributo, valor=1):
+        with self._lock:
+            setattr(self, atributo, getattr(self, atributo) + valor)
+
+
+class FolhaCronometrada:
+    """Envolve uma folha para registar quando cada submissão (pelo ID na última coluna) é gravada."""
+
+    def __init__(self, folha, registo):
+        self._folha = folha
+        self._registo = registo
+
+    def append_rows(self, values, **kwargs):
+        self._registo.somar("envios")
+        try:
+            resultado = self._folha.append_rows(values, **kwargs)
+        except Exception:
+            self._registo.somar("envios_falhados")
+            raise
+        agora = time.monotonic()
+        with self._registo._lock:
+            for linha in values:
+                self._registo.gravadas.setdefault(linha[-1], agora)
+        return resultado
+
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], **kwargs)
+
+    def __getattr__(self, nome):
+        return getattr(self._folha, nome)
+
+
+def respondente(indice, respostas, args, armazenamento, fila, folha_direta, registo, aleatorio):
+    escala = args.acelerar
+    time.sleep(aleatorio.uniform(0, args.rampa) / escala)
+    for _ in catalogo.lista_de_temas:
+        time.sleep(aleatorio.uniform(0.5, 1.5) * args.duracao_questionario / len(catalogo.lista_de_temas) / escala)
+
+    respostas_ordenadas = list(respostas[indice])
+    resultados = motor.calcular_escalas_finais(motor.calcular_pontuacoes(respostas_ordenadas))
+    linha = codec.codificar_linha(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), respostas_ordenadas, resultados)
+
+    inicio = time.monotonic()
+    if fila is not None:
+        id_submissao = fila.enfileirar(linha, armazenamento.fragmento_para(linha))
+        aceite = True
+    else:
+        id_submissao = uuid.uuid4().hex
+        aceite = False
+        for tentativa in range(args.tentativas):
+            if tentativa:
+                registo.somar("tentativas_extra")
+                time.sleep(2 ** tentativa / escala)
+            try:
+                folha_direta.append_row(linha + [id_submissao])
+                aceite = True
+                break
+            except Exception:
+                pass
+    fim = time.monotonic()
+    registo.adicionar("latencias_submissao", fim - inicio)
+    if aceite:
+        with registo._lock:
+            registo.submetidas[id_submissao] = inicio
+    else:
+        registo.somar("falhas_submissao")
+
+
+def administrador(args, armazenamento, cache, sincronizacao, registo, parar, aleatorio):
+    escala = args.acelerar
+    parar.wait(aleatorio.uniform(0, args.intervalo_admin) / escala)
+    while not parar.is_set():
+        inicio = time.monotonic()
+        try:
+            with sincronizacao["lock"]:
+                if inicio - sincronizacao["ultima"] >= 60 / escala:
+                    erros = cache.sincronizar(armazenamento)
+                    sincronizacao["ultima"] = time.monotonic()
+                    if erros:
+                        registo.somar("erros_admin")
+            cache.agregados().resumo()
+        except Exception:
+            registo.somar("erros_admin")
+        registo.adicionar("latencias_admin", time.monotonic() - inicio)
+        parar.wait(args.intervalo_admin / escala)
+
+
+def executar(args):
+    escala = args.acelerar
+    diretorio = tempfile.mkdtemp(prefix="copsoq_carga_")
+    # Os erros 429 do descarregador são esperados aqui e já entram nas contagens
+    logging.getLogger("fila_submissoes").setLevel(logging.CRITICAL)
+    limitador = LimitadorDeQuota(
+        args.leituras_por_minuto, args.escritas_por_minuto, args.latencia_leitura, args.latencia_escrita, escala, semente=args.semente
+    )
+    cliente = ClienteFalso(NOME_PLANILHA, limitador=limitador)
+    registo = Registo()
+    armazenamento = ArmazenamentoPlanilha(lambda: cliente, NOME_PLANILHA, args.criterio)
+    abrir_original = armazenamento.abrir
+    armazenamento.abrir = lambda fragmento: FolhaCronometrada(abrir_original(fragmento), registo)
+
+    limitador.ativo = False
+    garantir_cabecalho(cliente.open(NOME_PLANILHA).sheet1)
+    limitador.ativo = True
+
+    fila, folha_direta = None, None
+    if args.modo == "fila":
+        fila = FilaDeSubmissoes(os.path.join(diretorio, "fila.sqlite3"), espera_inicial=2.0 / escala, espera_maxima=300.0 / escala,
+                                espera_agrupamento=0.5 / escala, intervalo_minimo=5.0 / escala)
+        fila.iniciar_descarregador(armazenamento.abrir, intervalo=5.0 / escala)
+    else:
+        folha_direta = armazenamento.abrir("")
+
+    respostas = gerar_respostas(args.respondentes, semente=args.semente)
+    parar_admin = threading.Event()
+    cache = CacheFragmentado(os.path.join(diretorio, "cache"))
+    sincronizacao = {"lock": threading.Lock(), "ultima": float("-inf")}
+    threads_admin = [
+        threading.Thread(target=administrador, args=(args, armazenamento, cache, sincronizacao, registo, parar_admin, random.Random(args.semente + 10_000 + j)), daemon=True)
+        for j in range(args.administradores)
+    ]
+    threads = [
+        threading.Thread(target=respondente, args=(i, respostas, args, armazenamento, fila, folha_direta, registo, random.Random(args.semente + i)), daemon=True)
+        for i in range(args.respondentes)
+    ]
+
+    inicio = time.monotonic()
+    for thread in threads_admin + threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    fim_submissoes = time.monotonic()
+
+    if fila is not None:
+        limite = time.monotonic() + args.espera_final / escala
+        while fila.total_pendentes() and time.monotonic() < limite:
+            time.sleep(0.05)
+        fila.parar(5)
+    fim = time.monotonic()
+    parar_admin.set()
+    for thread in threads_admin:
+        thread.join(5)
+
+    limitador.ativo = False
+    ids_na_planilha = set()
+    for fragmento in armazenamento.fragmentos():
+        ids_na_planilha.update(abrir_original(fragmento).col_values(len(codec.cabecalho_compacto))[1:])
+
+    submetidas = registo.submetidas
+    perdidas = [i for i in submetidas if i not in ids_na_planilha]
+    ate_gravar = [registo.gravadas[i] - submetidas[i] for i in submetidas if i in registo.gravadas]
+    gravadas = len(submetidas) - len(perdidas)
+    duracao = (fim - inicio) * escala
+    pedidos = sum(limitador.aceites.values()) + sum(limitador.recusados.values())
+
+    def ms(segundos):
+        return None if segundos is None else round(segundos * escala * 1000, 1)
+
+    return {
+        "modo": args.modo,
+        "respondentes": args.respondentes,
+        "administradores": args.administradores,
+        "acelerar": escala,
+        "duracao_simulada_s": round(duracao, 1),
+        "duracao_submissoes_s": round((fim_submissoes - inicio) * escala, 1),
+        "submissoes_aceites": len(submetidas),
+        "submissoes_recusadas": registo.falhas_submissao,
+        "submissoes_gravadas": gravadas,
+        "submissoes_perdidas": len(perdidas) + registo.falhas_submissao,
+        "pendentes_na_fila": fila.total_pendentes() if fila is not None else 0,
+        "debito_por_minuto": round(gravadas / duracao * 60, 1) if duracao else None,
+        "latencia_submissao_p50_ms": ms(percentil(registo.latencias_submissao, 0.50)),
+        "latencia_submissao_p99_ms": ms(percentil(registo.latencias_submissao, 0.99)),
+        "ate_gravar_p50_ms": ms(percentil(ate_gravar, 0.50)),
+        "ate_gravar_p99_ms": ms(percentil(ate_gravar, 0.99)),
+        "envios": registo.envios,
+        "envios_falhados": registo.envios_falhados,
+        "taxa_repeticao": round(registo.envios_falhados / registo.envios, 4) if registo.envios else 0.0,
+        "tentativas_extra": registo.tentativas_extra,
+        "pedidos_api": dict(limitador.aceites),
+        "pedidos_api_recusados": dict(limitador.recusados),
+        "taxa_erro_api": round(sum(limitador.recusados.values()) / pedidos, 4) if pedidos else 0.0,
+        "admin_atualizacoes": len(registo.latencias_admin),
+        "admin_p50_ms": ms(percentil(registo.latencias_admin, 0.50)),
+        "admin_p99_ms": ms(percentil(registo.latencias_admin, 0.99)),
+        "admin_erros": registo.erros_admin,
+    }
+
+
+def imprimir(resultado):
+    print(f"Modo {resultado['modo']}: {resultado['respondentes']} respondentes, {resultado['administradores']} administradores, "
+          f"{resultado['duracao_simulada_s']:.0f} s simulados")
+    print(f"  Submissões: {resultado['submissoes_aceites']} aceites, {resultado['submissoes_recusadas']} recusadas, "
+          f"{resultado['submissoes_gravadas']} gravadas, {resultado['submissoes_perdidas']} perdidas "
+          f"({resultado['pendentes_na_fila']} ainda na fila)")
+    print(f"  Débito: {resultado['debito_por_minuto']} submissões gravadas por minuto")
+    print(f"  Latência da submissão: p50 {resultado['latencia_submissao_p50_ms']} ms, p99 {resultado['latencia_submissao_p99_ms']} ms")
+    print(f"  Até estar na planilha: p50 {resultado['ate_gravar_p50_ms']} ms, p99 {resultado['ate_gravar_p99_ms']} ms")
+    print(f"  Envios à planilha: {resultado['envios']} ({resultado['envios_falhados']} falhados, taxa de repetição "
+          f"{resultado['taxa_repeticao']:.1%}), tentativas extra dos respondentes: {resultado['tentativas_extra']}")
+    print(f"  Pedidos à API: {resultado['pedidos_api']}, recusados (429): {resultado['pedidos_api_recusados']} "
+          f"(taxa de erro {resultado['taxa_erro_api']:.1%})")
+    if resultado["administradores"]:
+        print(f"  Painel: {resultado['admin_atualizacoes']} atualizações, p50 {resultado['admin_p50_ms']} ms, "
+              f"p99 {resultado['admin_p99_ms']} ms, {resultado['admin_erros']} com erro")
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--respondentes", type=int, default=100)
+    parser.add_argument("--modo", choices=("fila", "direto"), default="fila")
+    parser.add_argument("--administradores", type=int, default=0, help="painéis do consultor abertos em simultâneo")
+    parser.add_argument("--acelerar", type=float, default=1.0, help="fator de aceleração do tempo (10 = um minuto dura 6 s)")
+    parser.add_argument("--duracao-questionario", type=float, default=300.0, help="tempo médio para responder (s)")
+    parser.add_argument("--rampa", type=float, default=60.0, help="intervalo em que os respondentes começam (s)")
+    parser.add_argument("--leituras-por-minuto", type=int, default=60)
+    parser.add_argument("--escritas-por-minuto", type=int, default=60)
+    parser.add_argument("--latencia-leitura", type=float, default=0.15, help="mediana (s)")
+    parser.add_argument("--latencia-escrita", type=float, default=0.4, help="mediana (s)")
+    parser.add_argument("--tentativas", type=int, default=1, help="tentativas de cada respondente no modo direto")
+    parser.add_argument("--intervalo-admin", type=float, default=30.0, help="intervalo entre atualizações do painel (s)")
+    parser.add_argument("--espera-final", type=float, default=600.0, help="tempo máximo para a fila esvaziar no fim (s)")
+    parser.add_argument("--criterio", choices=("mes", "campanha"), default=None, help="fragmentação do armazenamento")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--rotulo", default=None)
+    args = parser.parse_args(argumentos)
+
+    resultado = executar(args)
+    imprimir(resultado)
+
+    rotulo = args.rotulo or f"{args.modo}_{args.respondentes}"
+    os.makedirs(DIRETORIO_RESULTADOS, exist_ok=True)
+    caminho = os.path.join(DIRETORIO_RESULTADOS, f"carga_{rotulo}.json")
+    with open(caminho, "w", encoding="utf-8") as ficheiro:
+        json.dump({"rotulo": rotulo, "data": datetime.now().isoformat(timespec="seconds"), **resultado}, ficheiro, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {caminho}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
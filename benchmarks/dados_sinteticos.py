@@ -0,0 +1,69 @@
+"""
+Geradores de respostas sintéticas para benchmarks e testes de carga.
+
+As respostas são sorteadas com NumPy (semente fixa, para resultados reprodutíveis) e
+as linhas da planilha saem como texto, tal como a API as devolve, no formato compacto
+gravado pela aplicação ou no formato largo original (com uma parte das escalas em
+vírgula decimal, como acontece nas planilhas antigas).
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import calculadora_copsoq as motor  # noqa: E402
+import codec_respostas as codec  # noqa: E402
+from planilha_falsa import ClienteFalso  # noqa: E402
+
+OPCOES = np.array(["Nunca", "Raramente", "Às vezes", "Frequentemente", "Sempre"], dtype=object)
+
+
+def gerar_respostas(n, semente=0, prob_omissao=0.01):
+    """Matriz N×84 (objetos) de respostas em texto, com None nas perguntas omitidas."""
+    gerador = np.random.default_rng(semente)
+    respostas = OPCOES[gerador.integers(0, len(OPCOES), size=(n, motor.TOTAL_PERGUNTAS))]
+    if prob_omissao:
+        respostas[gerador.random((n, motor.TOTAL_PERGUNTAS)) < prob_omissao] = None
+    return respostas
+
+
+def _formatar_escalas(escalas, gerador, prob_virgula):
+    valores_unicos, inversos = np.unique(escalas, return_inverse=True)
+    com_ponto = np.array(["" if np.isnan(v) else f"{v:g}" for v in valores_unicos], dtype=object)
+    com_virgula = np.array([texto.replace(".", ",") for texto in com_ponto], dtype=object)
+    inversos = inversos.reshape(escalas.shape)
+    usar_virgula = gerador.random(escalas.shape) < prob_virgula
+    return np.where(usar_virgula, com_virgula[inversos], com_ponto[inversos])
+
+
+def gerar_linhas_planilha(n, semente=0, prob_omissao=0.01, prob_virgula=0.3, inicio="2024-01-01", dias=730, formato="compacto"):
+    """Linhas (sem cabeçalho) tal como `worksheet.get_all_values()` as devolveria, no formato "compacto" ou "largo"."""
+    gerador = np.random.default_rng(semente + 1)
+    respostas = gerar_respostas(n, semente, prob_omissao)
+    escalas = motor.calcular_escalas_lote(motor.calcular_pontuacoes_lote(respostas))
+    segundos = np.sort(gerador.integers(0, dias * 86400, size=n))
+    timestamps = (pd.Timestamp(inicio) + pd.to_timedelta(segundos, unit="s")).strftime("%Y-%m-%d %H:%M:%S")
+    ids = np.array([f"{i:032x}" for i in gerador.integers(0, 2**62, size=n)], dtype=object)
+
+    if formato == "compacto":
+        linhas = np.empty((n, len(codec.cabecalho_compacto)), dtype=object)
+        linhas[:, 1] = codec.empacotar_respostas(codec.codificar_respostas(respostas))
+        linhas[:, 2:-1] = _formatar_escalas(np.round(escalas * 100), gerador, 0.0)
+    else:
+        linhas = np.empty((n, len(motor.cabecalho_planilha)), dtype=object)
+        linhas[:, 1:1 + motor.TOTAL_PERGUNTAS] = np.where(respostas == None, "", respostas)  # noqa: E711
+        linhas[:, 1 + motor.TOTAL_PERGUNTAS:-1] = _formatar_escalas(escalas, gerador, prob_virgula)
+    linhas[:, 0] = np.asarray(timestamps, dtype=object)
+    linhas[:, -1] = ids
+    return linhas.tolist()
+
+
+def criar_cliente_falso(n, nome_planilha="Resultados_COPSOQ", **kwargs):
+    """ClienteFalso cuja sheet1 tem o cabeçalho e `n` respostas sintéticas."""
+    cliente = ClienteFalso(nome_planilha)
+    cabecalho = codec.cabecalho_compacto if kwargs.get("formato", "compacto") == "compacto" else motor.cabecalho_planilha
+    cliente.open(nome_planilha).sheet1.carregar_valores([cabecalho] + gerar_linhas_planilha(n, **kwargs))
+    return cliente
@@ -0,0 +1,319 @@
+"""
+Benchmarks dos caminhos críticos da aplicação, com respostas sintéticas e a planilha falsa.
+
+Mede o tempo (mediana de várias repetições) e o pico de memória (tracemalloc) de:
+- pontuação por respondente (`calcular_pontuacoes` / `calcular_escalas_finais`) e em lote;
+- leitura das linhas da planilha pelo codec, nos formatos compacto e largo;
+- sincronização da planilha para o cache local (inicial e incremental) e construção do DataFrame;
+- reconstrução dos agregados a partir das linhas da planilha e resumo do painel;
+- geração do relatório PDF (sem e com cache);
+- exportação em blocos (CSV e Parquet);
+- indicadores psicométricos (alfa de Cronbach, correlações item-total e bootstrap);
+- consultas aos agregados por período (resumo de um intervalo e tendência semanal).
+
+Uso (a partir da raiz do repositório):
+    python benchmarks/executar_benchmarks.py --tamanhos 10000 100000
+    python benchmarks/executar_benchmarks.py --tamanhos 1000000 --apenas pontuacao_em_lote
+    python benchmarks/executar_benchmarks.py --comparar benchmarks/resultados/<rotulo>.json
+
+Os resultados são gravados em JSON em `benchmarks/resultados/<rotulo>.json`. Com
+`--comparar`, cada medição é comparada com a da linha de base e o programa termina com
+código 1 se alguma piorar mais do que a tolerância.
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import calculadora_copsoq as motor  # noqa: E402
+import codec_respostas as codec  # noqa: E402
+import dados_sinteticos  # noqa: E402
+import exportacao  # noqa: E402
+import psicometria  # noqa: E402
+import relatorio_pdf  # noqa: E402
+from agregados import AgregadosEscalas  # noqa: E402
+from cache_respostas import CacheDeRespostas  # noqa: E402
+from planilha_falsa import WorksheetFalsa  # noqa: E402
+
+DIRETORIO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+LIMITE_POR_RESPONDENTE = 100_000  # o ciclo em Python por respondente é medido no máximo com este N
+
+BENCHMARKS = {}
+
+
+def benchmark(nome):
+    """Regista um benchmark: a função recebe o contexto e devolve o callable a medir (a preparação fica de fora)."""
+    def registar(funcao):
+        BENCHMARKS[nome] = funcao
+        return funcao
+    return registar
+
+
+class Contexto:
+    """Dados partilhados pelos benchmarks de um mesmo N, criados só quando são pedidos."""
+
+    def __init__(self, n, diretorio):
+        self.n = n
+        self.diretorio = diretorio
+        self._contador = 0
+
+    def caminho_temporario(self, sufixo):
+        self._contador += 1
+        return os.path.join(self.diretorio, f"{self._contador}{sufixo}")
+
+    @functools.cached_property
+    def linhas(self):
+        return dados_sinteticos.gerar_linhas_planilha(self.n)
+
+    @functools.cached_property
+    def linhas_largas(self):
+        return dados_sinteticos.gerar_linhas_planilha(self.n, formato="largo")
+
+    @functools.cached_property
+    def respostas(self):
+        return [linha[1:1 + motor.TOTAL_PERGUNTAS] for linha in self.linhas_largas]
+
+    @functools.cached_property
+    def worksheet(self):
+        folha = WorksheetFalsa()
+        folha.carregar_valores([codec.cabecalho_compacto] + self.linhas)
+        return folha
+
+    @functools.cached_property
+    def caminho_cache_sincronizado(self):
+        caminho = self.caminho_temporario(".sqlite3")
+        cache = CacheDeRespostas(caminho)
+        cache.sincronizar(self.worksheet)
+        cache.fechar()
+        return caminho
+
+    @functools.cached_property
+    def df_medias(self):
+        resumo = AgregadosEscalas.de_matriz(codec.descodificar_linhas(self.linhas)["escalas"]).resumo()
+        return resumo[["Escala", "Pontuação Média"]].sort_values("Pontuação Média").reset_index(drop=True)
+
+
+@benchmark("pontuacao_por_respondente")
+def _pontuacao_por_respondente(contexto):
+    respostas = contexto.respostas[:LIMITE_POR_RESPONDENTE]
+
+    def executar():
+        for linha in respostas:
+            motor.calcular_escalas_finais(motor.calcular_pontuacoes(linha))
+    return executar
+
+
+@benchmark("pontuacao_em_lote")
+def _pontuacao_em_lote(contexto):
+    respostas = contexto.respostas
+    return lambda: motor.calcular_escalas_lote(motor.calcular_pontuacoes_lote(respostas))
+
+
+@benchmark("codec_linhas_compactas")
+def _codec_linhas_compactas(contexto):
+    linhas = contexto.linhas
+    return lambda: codec.descodificar_linhas(linhas)
+
+
+@benchmark("codec_linhas_largas")
+def _codec_linhas_largas(contexto):
+    linhas = contexto.linhas_largas
+    return lambda: codec.descodificar_linhas(linhas)
+
+
+@benchmark("sincronizacao_inicial")
+def _sincronizacao_inicial(contexto):
+    cache = CacheDeRespostas(contexto.caminho_temporario(".sqlite3"))
+    worksheet = contexto.worksheet
+    return lambda: cache.sincronizar(worksheet)
+
+
+@benchmark("sincronizacao_incremental")
+def _sincronizacao_incremental(contexto):
+    # Cache já com as N respostas; a planilha recebe mais 1% de linhas novas
+    caminho = contexto.caminho_temporario(".sqlite3")
+    shutil.copy(contexto.caminho_cache_sincronizado, caminho)
+    cache = CacheDeRespostas(caminho)
+    worksheet = WorksheetFalsa()
+    novas = dados_sinteticos.gerar_linhas_planilha(max(contexto.n // 100, 1), semente=1)
+    worksheet.carregar_valores([codec.cabecalho_compacto] + contexto.linhas + novas)
+    return lambda: cache.sincronizar(worksheet)
+
+
+@benchmark("carregar_dataframe")
+def _carregar_dataframe(contexto):
+    cache = CacheDeRespostas(contexto.caminho_cache_sincronizado)
+    return cache.carregar_dataframe
+
+
+@benchmark("agregados_reconstrucao")
+def _agregados_reconstrucao(contexto):
+    linhas = contexto.linhas
+    return lambda: AgregadosEscalas.de_matriz(codec.descodificar_linhas(linhas)["escalas"])
+
+
+@benchmark("agregados_resumo")
+def _agregados_resumo(contexto):
+    agregados = AgregadosEscalas.de_matriz(codec.descodificar_linhas(contexto.linhas)["escalas"])
+    return agregados.resumo
+
+
+def _redirecionar_relatorios(contexto):
+    # O cache dos relatórios e a cópia do logotipo vão para a pasta temporária, não para a pasta atual
+    relatorio_pdf.DIRETORIO_CACHE = contexto.caminho_temporario("_relatorios")
+    relatorio_pdf.CAMINHO_LOGO_LOCAL = os.path.join(relatorio_pdf.DIRETORIO_CACHE, "logo.png")
+
+
+@benchmark("relatorio_pdf")
+def _relatorio_pdf(contexto):
+    _redirecionar_relatorios(contexto)
+    df_medias, total = contexto.df_medias, contexto.n
+    return lambda: relatorio_pdf.gerar_relatorio_pdf(df_medias, total)
+
+
+@benchmark("relatorio_pdf_em_cache")
+def _relatorio_pdf_em_cache(contexto):
+    _redirecionar_relatorios(contexto)
+    df_medias, total = contexto.df_medias, contexto.n
+    relatorio_pdf.gerar_relatorio_pdf(df_medias, total)
+    return lambda: relatorio_pdf.gerar_relatorio_pdf(df_medias, total)
+
+
+@benchmark("exportacao_csv")
+def _exportacao_csv(contexto):
+    cache = CacheDeRespostas(contexto.caminho_cache_sincronizado)
+    return lambda: exportacao.exportar_para_bytes(cache.iterar_blocos(), "csv")
+
+
+@benchmark("exportacao_parquet")
+def _exportacao_parquet(contexto):
+    cache = CacheDeRespostas(contexto.caminho_cache_sincronizado)
+    return lambda: exportacao.exportar_para_bytes(cache.iterar_blocos(), "parquet")
+
+
+@benchmark("psicometria")
+def _psicometria(contexto):
+    codigos = codec.descodificar_linhas(contexto.linhas)["codigos"]
+    return lambda: psicometria.analisar(codigos, reamostragens=1000)
+
+
+@benchmark("periodo_intervalo")
+def _periodo_intervalo(contexto):
+    # Intervalo que não começa nem acaba no dia 1 (meses completos e dias soltos nas pontas)
+    cache = CacheDeRespostas(contexto.caminho_cache_sincronizado)
+    return lambda: cache.totais_periodo("2024-02-15", "2025-08-20").resumo()
+
+
+@benchmark("periodo_tendencia")
+def _periodo_tendencia(contexto):
+    cache = CacheDeRespostas(contexto.caminho_cache_sincronizado)
+    return lambda: cache.serie_temporal("semana")
+
+
+def medir(preparar, contexto, repeticoes, medir_memoria):
+    tempos = []
+    for _ in range(repeticoes):
+        executar = preparar(contexto)
+        inicio = time.perf_counter()
+        executar()
+        tempos.append(time.perf_counter() - inicio)
+    resultado = {"segundos": statistics.median(tempos), "segundos_min": min(tempos)}
+    if medir_memoria:
+        executar = preparar(contexto)
+        tracemalloc.start()
+        executar()
+        resultado["pico_memoria_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return resultado
+
+
+def rotulo_da_versao():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return datetime.now().strftime("%Y%m%d-%H%M%S")
+
+
+def comparar(resultados, caminho_base, tolerancia):
+    """Imprime as diferenças face à linha de base e devolve a lista de regressões."""
+    with open(caminho_base, encoding="utf-8") as ficheiro:
+        base = {(r["nome"], r["n"]): r for r in json.load(ficheiro)["resultados"]}
+    regressoes = []
+    for resultado in resultados:
+        anterior = base.get((resultado["nome"], resultado["n"]))
+        if anterior is None:
+            continue
+        for metrica in ("segundos", "pico_memoria_mb"):
+            if metrica not in resultado or metrica not in anterior or not anterior[metrica]:
+                continue
+            variacao = resultado[metrica] / anterior[metrica] - 1
+            marca = ""
+            if variacao > tolerancia:
+                marca = "  <-- REGRESSÃO"
+                regressoes.append((resultado["nome"], resultado["n"], metrica, variacao))
+            print(f"{resultado['nome']:<28} n={resultado['n']:<9} {metrica:<16} {variacao:+7.1%}{marca}")
+    return regressoes
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000], help="números de respondentes")
+    parser.add_argument("--apenas", nargs="+", choices=sorted(BENCHMARKS), help="correr só estes benchmarks")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--sem-memoria", action="store_true", help="não medir o pico de memória (mais rápido)")
+    parser.add_argument("--rotulo", default=None, help="nome do ficheiro de resultados (por omissão, o commit atual)")
+    parser.add_argument("--comparar", default=None, help="ficheiro JSON de uma execução anterior")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="piora relativa aceite antes de acusar regressão")
+    args = parser.parse_args(argumentos)
+
+    nomes = args.apenas or list(BENCHMARKS)
+    resultados = []
+    for n in args.tamanhos:
+        with tempfile.TemporaryDirectory(prefix="copsoq_bench_") as diretorio:
+            contexto = Contexto(n, diretorio)
+            for nome in nomes:
+                resultado = {"nome": nome, "n": n}
+                if nome == "pontuacao_por_respondente":
+                    resultado["n_medido"] = min(n, LIMITE_POR_RESPONDENTE)
+                resultado.update(medir(BENCHMARKS[nome], contexto, args.repeticoes, not args.sem_memoria))
+                resultados.append(resultado)
+                memoria = f"{resultado['pico_memoria_mb']:9.1f} MB" if "pico_memoria_mb" in resultado else ""
+                print(f"{nome:<28} n={n:<9} {resultado['segundos']:9.4f} s {memoria}", flush=True)
+
+    rotulo = args.rotulo or rotulo_da_versao()
+    os.makedirs(DIRETORIO_RESULTADOS, exist_ok=True)
+    caminho = os.path.join(DIRETORIO_RESULTADOS, f"{rotulo}.json")
+    with open(caminho, "w", encoding="utf-8") as ficheiro:
+        json.dump({
+            "rotulo": rotulo,
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "resultados": resultados,
+        }, ficheiro, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {caminho}")
+
+    if args.comparar:
+        regressoes = comparar(resultados, args.comparar, args.tolerancia)
+        if regressoes:
+            print(f"{len(regressoes)} regressão(ões) acima de {args.tolerancia:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
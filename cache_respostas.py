@@ -0,0 +1,456 @@
+"""
+Cache local (SQLite) das respostas guardadas na Planilha Google, com sincronização incremental.
+
+O cache guarda o número da última linha da planilha já copiada e, em cada sincronização,
+lê apenas as linhas a partir daí com uma leitura por intervalo (`worksheet.get("A{n}:DM")`).
+A primeira linha lida é sempre a última já conhecida: se não coincidir com a guardada
+(linhas apagadas ou reordenadas na planilha), o cache é reconstruído do zero. A leitura da
+planilha é feita sem o lock das consultas, para que o painel continue a ler o cache enquanto
+ela decorre; só se aplica se entretanto nenhuma outra sincronização tiver mudado o cache.
+
+As linhas são lidas com `codec_respostas`, que aceita tanto o formato compacto como o
+formato largo original. No cache, as 84 respostas ficam numa coluna TEXT no formato
+compacto ("c1:..."), as 31 escalas como REAL e o DataFrame devolvido ao painel usa tipos
+compactos (respostas como `category`, escalas como `float32`). Os agregados por escala (`agregados.AgregadosEscalas`)
+são atualizados com as linhas novas na mesma transação e guardados junto do cache, tal como
+as somas por dia, semana e mês (`agregados_periodo`) que servem para filtrar e comparar
+intervalos de tempo sem ler as respostas.
+
+Com um armazenamento fragmentado (ver `armazenamento`), `CacheFragmentado` mantém um cache
+destes por fragmento, sincroniza-os em paralelo e junta os agregados de todos.
+"""
+import copy
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, unquote
+
+import gspread
+import numpy as np
+import pandas as pd
+
+import calculadora_copsoq as motor
+import codec_respostas as codec
+import metricas
+import agregados_periodo
+from agregados import AgregadosEscalas
+
+# Versão do esquema das tabelas; um cache com outra versão é apagado e reconstruído
+VERSAO_ESQUEMA = 2
+# Versão da tabela de agregados por período; com outra versão é refeita a partir das respostas em cache
+VERSAO_PERIODOS = 1
+# A leitura cobre a largura do formato original (117 colunas); as linhas compactas vêm mais curtas
+_LETRA_ULTIMA_COLUNA = gspread.utils.rowcol_to_a1(1, len(motor.cabecalho_planilha)).rstrip("0123456789")
+_COLUNAS_CACHE = codec.cabecalho_compacto
+
+
+def _citar(nome):
+    return '"' + nome.replace('"', '""') + '"'
+
+
+def _para_dataframe(compacto, recalcular_escalas=False):
+    """Expande as linhas do cache (respostas empacotadas) nas colunas de `cabecalho_planilha`."""
+    codigos = codec.desempacotar_respostas(compacto[codec.COLUNA_RESPOSTAS].tolist())
+    if recalcular_escalas:
+        escalas = motor.calcular_escalas_lote(codec.pontuacoes_de_codigos(codigos))
+    else:
+        escalas = compacto[list(motor.definicao_escalas)].to_numpy(dtype=float)
+    codigos = np.where(codigos == codec.CODIGO_AUSENTE, -1, codigos).astype(np.int8)
+
+    colunas_df = {"Timestamp": compacto["Timestamp"]}
+    for i in range(motor.TOTAL_PERGUNTAS):
+        colunas_df[f"Resp_Q{i + 1}"] = pd.Categorical.from_codes(codigos[:, i], categories=codec.rotulos_respostas)
+    for coluna, nome in enumerate(motor.definicao_escalas):
+        colunas_df[nome] = escalas[:, coluna].astype(np.float32)
+    colunas_df[motor.COLUNA_ID_SUBMISSAO] = compacto[motor.COLUNA_ID_SUBMISSAO]
+    return pd.DataFrame(colunas_df, columns=motor.cabecalho_planilha)
+
+
+class CacheDeRespostas:
+    def __init__(self, caminho):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self._lock = threading.Lock()
+        # Uma sincronização de cada vez (sem bloquear as consultas durante a leitura da planilha)
+        self._lock_sincronizacao = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute("CREATE TABLE IF NOT EXISTS metadados (chave TEXT PRIMARY KEY, valor TEXT)")
+        if self._ler_metadado("versao_esquema") != VERSAO_ESQUEMA:
+            self._conexao.execute("DROP TABLE IF EXISTS respostas")
+            self._conexao.execute("DELETE FROM metadados")
+            self._gravar_metadado("versao_esquema", VERSAO_ESQUEMA)
+        definicoes = ", ".join(
+            f"{_citar(nome)} {'REAL' if nome in motor.definicao_escalas else 'TEXT'}" for nome in _COLUNAS_CACHE
+        )
+        self._conexao.execute(f"CREATE TABLE IF NOT EXISTS respostas (linha_planilha INTEGER PRIMARY KEY, {definicoes})")
+        self._conexao.execute('CREATE INDEX IF NOT EXISTS respostas_timestamp ON respostas ("Timestamp")')
+        somas = ", ".join(f"{coluna} REAL NOT NULL" for coluna in agregados_periodo.COLUNAS_SOMAS)
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS periodos (granularidade TEXT NOT NULL, periodo TEXT NOT NULL, escala INTEGER NOT NULL,"
+            f" {somas}, PRIMARY KEY (granularidade, periodo, escala)) WITHOUT ROWID"
+        )
+        if self._ler_metadado("versao_periodos") != VERSAO_PERIODOS:
+            self._recalcular_periodos()
+
+        dados_agregados = self._ler_metadado("agregados")
+        if dados_agregados is not None:
+            self._agregados = AgregadosEscalas.de_dict(dados_agregados)
+        else:
+            self._agregados = self._recalcular_agregados()
+
+    def _ler_metadado(self, chave, padrao=None):
+        registo = self._conexao.execute("SELECT valor FROM metadados WHERE chave = ?", (chave,)).fetchone()
+        return json.loads(registo[0]) if registo else padrao
+
+    def _gravar_metadado(self, chave, valor):
+        self._conexao.execute(
+            "INSERT OR REPLACE INTO metadados (chave, valor) VALUES (?, ?)", (chave, json.dumps(valor, ensure_ascii=False))
+        )
+
+    def ultima_linha(self):
+        """Número (base 1) da última linha da planilha já copiada; 1 significa só o cabeçalho."""
+        with self._lock:
+            return self._ler_metadado("ultima_linha", 1)
+
+    def total_respostas(self):
+        with self._lock:
+            return self._conexao.execute("SELECT COUNT(*) FROM respostas").fetchone()[0]
+
+    def versao(self):
+        """Identifica o conteúdo do cache (última linha copiada e a respetiva marca), sem ler as respostas."""
+        with self._lock:
+            return [self._ler_metadado("ultima_linha", 1), self._ler_metadado("marca_ultima_linha")]
+
+    def agregados(self):
+        """Cópia dos agregados por escala de todas as respostas em cache."""
+        with self._lock:
+            return copy.deepcopy(self._agregados)
+
+    def _recalcular_agregados(self):
+        colunas = ", ".join(_citar(nome) for nome in motor.definicao_escalas)
+        registos = self._conexao.execute(f"SELECT {colunas} FROM respostas").fetchall()
+        return AgregadosEscalas.de_matriz(np.array(registos, dtype=float))
+
+    def _acumular_periodos(self, timestamps, escalas):
+        """Soma um lote de respostas à tabela de agregados por período (dentro da transação de quem chama)."""
+        colunas = agregados_periodo.COLUNAS_SOMAS
+        self._conexao.executemany(
+            f"INSERT INTO periodos (granularidade, periodo, escala, {', '.join(colunas)})"
+            f" VALUES (?, ?, ?, {', '.join(['?'] * len(colunas))})"
+            f" ON CONFLICT (granularidade, periodo, escala) DO UPDATE SET"
+            f" {', '.join(f'{c} = {c} + excluded.{c}' for c in colunas)}",
+            agregados_periodo.somas_por_periodo(timestamps, escalas),
+        )
+
+    def _recalcular_periodos(self, tamanho_bloco=20000):
+        colunas = ", ".join(_citar(nome) for nome in ["Timestamp", *motor.definicao_escalas])
+        self._conexao.execute("BEGIN")
+        try:
+            self._conexao.execute("DELETE FROM periodos")
+            cursor = self._conexao.execute(f"SELECT {colunas} FROM respostas")
+            while registos := cursor.fetchmany(tamanho_bloco):
+                self._acumular_periodos([r[0] for r in registos], np.array([r[1:] for r in registos], dtype=float))
+            self._gravar_metadado("versao_periodos", VERSAO_PERIODOS)
+        except Exception:
+            self._conexao.execute("ROLLBACK")
+            raise
+        self._conexao.execute("COMMIT")
+
+    @metricas.cronometrado("cache_sincronizar")
+    def sincronizar(self, worksheet):
+        """
+        Copia para o cache as linhas novas da planilha. Devolve as linhas acrescentadas no
+        formato de `codec_respostas.descodificar_linhas` (lista vazia se não houver novas).
+        """
+        with self._lock_sincronizacao:
+            with self._lock:
+                ultima = self._ler_metadado("ultima_linha", 1)
+                marca = self._ler_metadado("marca_ultima_linha")
+            inicio = max(ultima, 2)
+            valores = worksheet.get(f"A{inicio}:{_LETRA_ULTIMA_COLUNA}")
+            reconstruir = ultima >= 2 and (not valores or codec.sem_vazios_finais(valores[0]) != marca)
+            if reconstruir:
+                inicio, valores = 2, worksheet.get(f"A2:{_LETRA_ULTIMA_COLUNA}")
+            elif ultima >= 2:
+                valores = valores[1:]
+                inicio += 1
+            with self._lock:
+                if self._ler_metadado("ultima_linha", 1) != ultima:
+                    # Outra instância sincronizou o mesmo ficheiro durante a leitura: esta já não serve
+                    return []
+                if reconstruir:
+                    self._limpar()
+                return self._acrescentar(inicio, valores)
+
+    def _acrescentar(self, inicio, valores):
+        if not valores:
+            return []
+        lidas = codec.descodificar_linhas(valores)
+        respostas = codec.empacotar_respostas(lidas["codigos"])
+        escalas = lidas["escalas"]
+        linhas = [
+            [inicio + i, lidas["timestamps"][i], respostas[i]]
+            + [None if np.isnan(v) else v for v in escalas[i].tolist()]
+            + [lidas["ids"][i]]
+            for i in range(len(valores))
+        ]
+        colunas = ", ".join(["linha_planilha"] + [_citar(nome) for nome in _COLUNAS_CACHE])
+        marcadores = ", ".join(["?"] * (len(_COLUNAS_CACHE) + 1))
+        agregados = copy.deepcopy(self._agregados).mesclar(AgregadosEscalas.de_matriz(escalas))
+        self._conexao.execute("BEGIN")
+        try:
+            self._conexao.executemany(
+                f"INSERT OR REPLACE INTO respostas ({colunas}) VALUES ({marcadores})",
+                linhas,
+            )
+            self._gravar_metadado("ultima_linha", inicio + len(valores) - 1)
+            self._gravar_metadado("marca_ultima_linha", codec.sem_vazios_finais(valores[-1]))
+            self._gravar_metadado("agregados", agregados.para_dict())
+            self._acumular_periodos(lidas["timestamps"], escalas)
+        except Exception:
+            self._conexao.execute("ROLLBACK")
+            raise
+        self._conexao.execute("COMMIT")
+        self._agregados = agregados
+        metricas.contar("linhas_sincronizadas", len(valores))
+        return lidas
+
+    def _limpar(self):
+        self._conexao.execute("DELETE FROM respostas")
+        self._conexao.execute("DELETE FROM periodos")
+        self._conexao.execute("DELETE FROM metadados")
+        self._gravar_metadado("versao_esquema", VERSAO_ESQUEMA)
+        self._gravar_metadado("versao_periodos", VERSAO_PERIODOS)
+        self._agregados = AgregadosEscalas()
+
+    def carregar_codigos(self):
+        """Matriz N×84 `uint8` com os códigos das respostas em cache (255 = sem resposta)."""
+        with self._lock:
+            registos = self._conexao.execute(
+                f"SELECT {_citar(codec.COLUNA_RESPOSTAS)} FROM respostas ORDER BY linha_planilha"
+            ).fetchall()
+        return codec.desempacotar_respostas([registo[0] for registo in registos])
+
+    @metricas.cronometrado("cache_carregar_dataframe")
+    def carregar_dataframe(self):
+        """
+        Devolve todas as respostas em cache, pela ordem da planilha, com as colunas de
+        `cabecalho_planilha`: respostas como `category` (rótulos de texto) e escalas como `float32`.
+        """
+        colunas = ", ".join(_citar(nome) for nome in _COLUNAS_CACHE)
+        with self._lock:
+            compacto = pd.read_sql_query(f"SELECT {colunas} FROM respostas ORDER BY linha_planilha", self._conexao)
+        return _para_dataframe(compacto)
+
+    def iterar_blocos(self, tamanho_bloco=5000, inicio=None, fim=None, recalcular_escalas=False):
+        """
+        Percorre as respostas em cache em DataFrames de até `tamanho_bloco` linhas (mesmas colunas
+        de `carregar_dataframe`), sem nunca carregar a tabela inteira. `inicio` e `fim` filtram pelo
+        Timestamp (texto "AAAA-MM-DD HH:MM:SS", `fim` exclusivo). Com `recalcular_escalas`, as escalas
+        são calculadas de novo a partir das respostas em vez de usar os valores gravados.
+        """
+        colunas = ", ".join(["linha_planilha"] + [_citar(nome) for nome in _COLUNAS_CACHE])
+        condicoes, parametros = ["linha_planilha > ?"], []
+        if inicio is not None:
+            condicoes.append('"Timestamp" >= ?')
+            parametros.append(inicio)
+        if fim is not None:
+            condicoes.append('"Timestamp" < ?')
+            parametros.append(fim)
+        consulta = f"SELECT {colunas} FROM respostas WHERE {' AND '.join(condicoes)} ORDER BY linha_planilha LIMIT ?"
+
+        ultima = 0
+        while True:
+            with self._lock:
+                compacto = pd.read_sql_query(consulta, self._conexao, params=[ultima] + parametros + [tamanho_bloco])
+            if compacto.empty:
+                return
+            ultima = int(compacto["linha_planilha"].iloc[-1])
+            yield _para_dataframe(compacto, recalcular_escalas)
+            if len(compacto) < tamanho_bloco:
+                return
+
+    def intervalo_datas(self):
+        """
+        (primeiro, último) dia com respostas, como texto "AAAA-MM-DD", a partir dos agregados por
+        dia (ignoram os Timestamps que não são datas); (None, None) se não houver nenhum.
+        """
+        with self._lock:
+            return self._conexao.execute("SELECT MIN(periodo), MAX(periodo) FROM periodos WHERE granularidade = 'dia'").fetchone()
+
+    def _registos_intervalo(self, inicio=None, fim=None):
+        condicoes, parametros = [], []
+        for granularidade, desde, ate in agregados_periodo.intervalos_de_consulta(inicio, fim):
+            condicao = ["granularidade = ?"]
+            parametros.append(granularidade)
+            if desde is not None:
+                condicao.append("periodo >= ?")
+                parametros.append(desde)
+            if ate is not None:
+                condicao.append("periodo < ?")
+                parametros.append(ate)
+            condicoes.append(f"({' AND '.join(condicao)})")
+        somas = ", ".join(f"SUM({coluna})" for coluna in agregados_periodo.COLUNAS_SOMAS)
+        with self._lock:
+            return self._conexao.execute(
+                f"SELECT escala, {somas} FROM periodos WHERE {' OR '.join(condicoes)} GROUP BY escala", parametros
+            ).fetchall()
+
+    def _registos_serie(self, granularidade, inicio=None, fim=None):
+        if granularidade not in agregados_periodo.GRANULARIDADES:
+            raise ValueError(f"Granularidade desconhecida: {granularidade!r}")
+        primeira, ultima = agregados_periodo.limites_da_serie(granularidade, inicio, fim)
+        consulta, parametros = "SELECT periodo, escala, contagem, soma FROM periodos WHERE granularidade = ?", [granularidade]
+        if primeira is not None:
+            consulta += " AND periodo >= ?"
+            parametros.append(primeira)
+        if ultima is not None:
+            consulta += " AND periodo <= ?"
+            parametros.append(ultima)
+        with self._lock:
+            return self._conexao.execute(consulta + " ORDER BY periodo, escala", parametros).fetchall()
+
+    def totais_periodo(self, inicio=None, fim=None):
+        """
+        `agregados_periodo.TotaisPeriodo` das respostas com data em [inicio, fim) ("AAAA-MM-DD";
+        None = sem limite), calculados a partir dos agregados por período.
+        """
+        return agregados_periodo.TotaisPeriodo.de_registos(self._registos_intervalo(inicio, fim))
+
+    def comparar_periodos(self, periodo_a, periodo_b):
+        """Compara as médias das escalas em dois intervalos (inicio, fim) — ver `agregados_periodo.comparar`."""
+        return agregados_periodo.comparar(self.totais_periodo(*periodo_a), self.totais_periodo(*periodo_b))
+
+    def serie_temporal(self, granularidade="mes", inicio=None, fim=None):
+        """Média de cada escala por dia, semana ou mês nos períodos que tocam [inicio, fim) (ver `agregados_periodo.tabela_de_tendencia`)."""
+        return agregados_periodo.tabela_de_tendencia(self._registos_serie(granularidade, inicio, fim))
+
+    def fechar(self):
+        with self._lock:
+            self._conexao.close()
+
+
+class CacheFragmentado:
+    """
+    Um `CacheDeRespostas` por fragmento do armazenamento, todos na mesma pasta. O fragmento
+    principal ("") usa o ficheiro `cache_respostas.sqlite3` de sempre; os restantes, um
+    `cache_respostas_<fragmento>.sqlite3`. Os fragmentos já em cache continuam disponíveis
+    mesmo que o armazenamento não responda.
+    """
+
+    PREFIXO = "cache_respostas"
+
+    def __init__(self, diretorio, max_threads=8):
+        os.makedirs(diretorio, exist_ok=True)
+        self.diretorio = diretorio
+        self.max_threads = max_threads
+        self._lock = threading.Lock()
+        self._caches = {}
+        for nome in sorted(os.listdir(diretorio)):
+            if nome.startswith(self.PREFIXO) and nome.endswith(".sqlite3"):
+                resto = nome[len(self.PREFIXO):-len(".sqlite3")]
+                if resto == "" or resto.startswith("_"):
+                    self._cache(unquote(resto[1:]))
+
+    def _cache(self, fragmento):
+        with self._lock:
+            if fragmento not in self._caches:
+                sufixo = f"_{quote(fragmento, safe='')}" if fragmento else ""
+                self._caches[fragmento] = CacheDeRespostas(os.path.join(self.diretorio, f"{self.PREFIXO}{sufixo}.sqlite3"))
+            return self._caches[fragmento]
+
+    def _por_ordem(self):
+        with self._lock:
+            return [self._caches[f] for f in sorted(self._caches)]
+
+    def fragmentos(self):
+        with self._lock:
+            return sorted(self._caches)
+
+    @metricas.cronometrado("cache_fragmentado_sincronizar")
+    def sincronizar(self, armazenamento):
+        """
+        Sincroniza em paralelo os caches de todos os fragmentos do armazenamento. Fragmentos
+        fechados que já estejam em cache não são lidos de novo. Devolve {fragmento: exceção}
+        com os que falharam.
+        """
+        pendentes = [
+            fragmento for fragmento in armazenamento.fragmentos()
+            if not (armazenamento.fragmento_fechado(fragmento) and self._cache(fragmento).ultima_linha() > 1)
+        ]
+
+        def sincronizar_fragmento(fragmento):
+            self._cache(fragmento).sincronizar(armazenamento.abrir(fragmento))
+
+        erros = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_threads, len(pendentes)))) as executor:
+            futuros = {fragmento: executor.submit(sincronizar_fragmento, fragmento) for fragmento in pendentes}
+        for fragmento, futuro in futuros.items():
+            if futuro.exception() is not None:
+                erros[fragmento] = futuro.exception()
+        return erros
+
+    def total_respostas(self):
+        return sum(cache.total_respostas() for cache in self._por_ordem())
+
+    def versao(self):
+        with self._lock:
+            caches = sorted(self._caches.items())
+        texto = json.dumps([[fragmento, cache.versao()] for fragmento, cache in caches], ensure_ascii=False)
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+    def agregados(self):
+        """Agregados por escala de todos os fragmentos, combinados."""
+        total = AgregadosEscalas()
+        for cache in self._por_ordem():
+            total.mesclar(cache.agregados())
+        return total
+
+    def carregar_codigos(self):
+        caches = self._por_ordem()
+        if not caches:
+            return np.empty((0, motor.TOTAL_PERGUNTAS), dtype=np.uint8)
+        return np.vstack([cache.carregar_codigos() for cache in caches])
+
+    def carregar_dataframe(self):
+        quadros = [cache.carregar_dataframe() for cache in self._por_ordem()]
+        quadros = [df for df in quadros if not df.empty]
+        if not quadros:
+            return _para_dataframe(pd.DataFrame(columns=_COLUNAS_CACHE))
+        return pd.concat(quadros, ignore_index=True) if len(quadros) > 1 else quadros[0]
+
+    def iterar_blocos(self, tamanho_bloco=5000, inicio=None, fim=None, recalcular_escalas=False):
+        """Como `CacheDeRespostas.iterar_blocos`, percorrendo os fragmentos um a seguir ao outro."""
+        return itertools.chain.from_iterable(
+            cache.iterar_blocos(tamanho_bloco, inicio, fim, recalcular_escalas) for cache in self._por_ordem()
+        )
+
+    def intervalo_datas(self):
+        intervalos = [cache.intervalo_datas() for cache in self._por_ordem()]
+        primeiros = [primeiro for primeiro, _ in intervalos if primeiro]
+        ultimos = [ultimo for _, ultimo in intervalos if ultimo]
+        return (min(primeiros) if primeiros else None, max(ultimos) if ultimos else None)
+
+    def totais_periodo(self, inicio=None, fim=None):
+        total = agregados_periodo.TotaisPeriodo()
+        for cache in self._por_ordem():
+            total.mesclar(cache.totais_periodo(inicio, fim))
+        return total
+
+    def comparar_periodos(self, periodo_a, periodo_b):
+        return agregados_periodo.comparar(self.totais_periodo(*periodo_a), self.totais_periodo(*periodo_b))
+
+    def serie_temporal(self, granularidade="mes", inicio=None, fim=None):
+        return agregados_periodo.tabela_de_tendencia(
+            itertools.chain.from_iterable(cache._registos_serie(granularidade, inicio, fim) for cache in self._por_ordem())
+        )
+
+    def fechar(self):
+        for cache in self._por_ordem():
+            cache.fechar()
@@ -1,4 +1,4 @@
-import statistics
+import numpy as np
 
 # Parte 1: O Dicionário de Pontuação
 pontuacao_map = {
@@ -8,23 +8,15 @@ pontuacao_map = {
     None: None
 }
 
+TOTAL_PERGUNTAS = 84
+
+# Índices (base 0) das perguntas com pontuação invertida (Q58)
+perguntas_invertidas = (57,)
+
 # Parte 2: A Função que Calcula as Pontuações (COM inversão da Q58)
 def calcular_pontuacoes(respostas):
-    pontuacoes_calculadas = []
-    total_de_perguntas = 84
-    respostas_completas = respostas + [None] * (total_de_perguntas - len(respostas))
-    
-    for i, resposta_texto in enumerate(respostas_completas):
-        numero_da_pergunta = i + 1
-        pontuacao = pontuacao_map.get(resposta_texto)
-        
-        if numero_da_pergunta == 58 and pontuacao is not None:
-            pontuacao_final = 100 - pontuacao
-        else:
-            pontuacao_final = pontuacao
-        pontuacoes_calculadas.append(pontuacao_final)
-        
-    return pontuacoes_calculadas
+    pontuacoes = calcular_pontuacoes_lote([respostas])[0]
+    return [None if np.isnan(p) else int(p) for p in pontuacoes]
 
 # Parte 3: A Definição das 31 Escalas (Conforme documento oficial)
 definicao_escalas = {
@@ -47,14 +39,78 @@ definicao_escalas = {
 
 # Parte 4: A Função que Calcula as Médias
 def calcular_escalas_finais(pontuacoes):
-    resultados_finais = {}
-    for nome_escala, indices in definicao_escalas.items():
-        pontuacoes_da_escala = [pontuacoes[i] for i in indices if pontuacoes[i] is not None]
-        
-        if pontuacoes_da_escala:
-            media = statistics.mean(pontuacoes_da_escala)
-            resultados_finais[nome_escala] = round(media, 2)
-        else:
-            resultados_finais[nome_escala] = None
-            
-    return resultados_finais
\ No newline at end of file
+    medias = calcular_escalas_lote([pontuacoes])[0]
+    # Como antes do cálculo em lote: médias inteiras como int (25, não 25.0)
+    return {
+        nome: (None if np.isnan(media) else int(media) if media.is_integer() else float(media))
+        for nome, media in zip(definicao_escalas, medias)
+    }
+
+# Parte 5: Cálculo em Lote (N respondentes de uma só vez)
+# Matriz 84×31 que indica a que escala pertence cada pergunta
+matriz_escalas = np.zeros((TOTAL_PERGUNTAS, len(definicao_escalas)))
+for _coluna, _indices in enumerate(definicao_escalas.values()):
+    matriz_escalas[_indices, _coluna] = 1.0
+
+# Opções de resposta por ordem alfabética e a pontuação de cada uma; a última posição (NaN)
+# é a das respostas vazias ou desconhecidas
+_rotulos_ordenados = np.array(sorted(texto for texto in pontuacao_map if texto is not None))
+_pontos_ordenados = np.array([pontuacao_map[texto] for texto in _rotulos_ordenados] + [np.nan], dtype=float)
+# Um carácter a mais do que a opção mais longa: um texto cortado nesta largura nunca coincide com uma opção
+_tipo_texto = f"U{max(len(texto) for texto in _rotulos_ordenados) + 1}"
+
+def _matriz_de_respostas(respostas_lote):
+    """Normaliza o lote numa matriz N×84 de objetos, completando com None as linhas curtas."""
+    if hasattr(respostas_lote, "to_numpy"):  # DataFrame do pandas
+        respostas_lote = respostas_lote.to_numpy(dtype=object)
+    if isinstance(respostas_lote, np.ndarray) and respostas_lote.ndim == 2:
+        linhas = respostas_lote
+    else:
+        linhas = [list(linha) for linha in respostas_lote]
+    matriz = np.full((len(linhas), TOTAL_PERGUNTAS), None, dtype=object)
+    for i, linha in enumerate(linhas):
+        linha = linha[:TOTAL_PERGUNTAS]
+        matriz[i, :len(linha)] = linha
+    return matriz
+
+def calcular_pontuacoes_lote(respostas_lote):
+    """
+    Converte uma matriz N×84 de respostas em texto (lista de listas, array ou DataFrame)
+    numa matriz N×84 de pontuações 0-100, com NaN nas perguntas sem resposta
+    e com a inversão das perguntas em `perguntas_invertidas` já aplicada.
+    """
+    matriz = _matriz_de_respostas(respostas_lote)
+    texto = matriz.astype(_tipo_texto)  # None passa a "None", que não é uma opção
+    posicoes = np.searchsorted(_rotulos_ordenados, texto)
+    np.minimum(posicoes, len(_rotulos_ordenados) - 1, out=posicoes)
+    encontradas = _rotulos_ordenados[posicoes] == texto
+    pontuacoes = _pontos_ordenados[np.where(encontradas, posicoes, len(_rotulos_ordenados))]
+
+    pontuacoes[:, perguntas_invertidas] = 100 - pontuacoes[:, perguntas_invertidas]
+    return pontuacoes
+
+def calcular_escalas_lote(pontuacoes_lote):
+    """
+    Converte uma matriz N×84 de pontuações (NaN ou None = sem resposta) numa matriz N×31
+    com a média de cada escala, pela ordem de `definicao_escalas`, arredondada a 2 casas.
+    Escalas sem nenhuma resposta ficam a NaN.
+    """
+    pontuacoes = np.asarray(pontuacoes_lote, dtype=float).reshape(-1, TOTAL_PERGUNTAS)
+    respondidas = ~np.isnan(pontuacoes)
+    somas = np.where(respondidas, pontuacoes, 0.0) @ matriz_escalas
+    contagens = respondidas.astype(float) @ matriz_escalas
+    with np.errstate(invalid="ignore", divide="ignore"):
+        medias = somas / contagens
+    return np.round(medias, 2)
+
+# Parte 6: As Colunas dos Resultados
+# Timestamp, as 84 respostas, as 31 escalas e o identificador único da submissão.
+# É o formato largo original da planilha e o formato do DataFrame do painel;
+# o formato compacto gravado na planilha está em codec_respostas.py.
+COLUNA_ID_SUBMISSAO = "ID_Submissao"
+cabecalho_planilha = (
+    ["Timestamp"]
+    + [f"Resp_Q{i}" for i in range(1, TOTAL_PERGUNTAS + 1)]
+    + list(definicao_escalas.keys())
+    + [COLUNA_ID_SUBMISSAO]
+)
@@ -0,0 +1,168 @@
+"""
+Formato compacto das respostas: um código de 0 a 4 por pergunta e as escalas em centésimos.
+
+Em memória, as 84 respostas de cada respondente são uma linha de uma matriz `uint8`
+(0 = "Nunca" ... 4 = "Sempre", 255 = sem resposta). Na planilha ocupam uma única célula
+de texto com um carácter por pergunta, precedida da versão do formato:
+
+    c1:0123401234...-...      ("-" = sem resposta)
+
+As 31 escalas são gravadas como números inteiros em centésimos (33,33 -> 3333), pelo que
+deixa de haver ambiguidade entre vírgula e ponto decimal. Uma linha compacta tem 34 colunas
+(ver `cabecalho_compacto`) em vez das 117 do formato original; as funções de leitura aceitam
+os dois formatos, linha a linha, para que planilhas antigas continuem legíveis.
+
+Os códigos seguem a pontuação de `pontuacao_map` (código = pontuação / 25), pelo que as
+opções de intensidade e qualidade também são aceites; ao descodificar, usam-se os rótulos
+de frequência, que são os do questionário.
+"""
+import numpy as np
+
+import calculadora_copsoq as motor
+from catalogo_perguntas import opcoes_frequencia
+
+VERSAO_FORMATO = "c1:"
+CODIGO_AUSENTE = 255
+CARACTER_AUSENTE = "-"
+rotulos_respostas = opcoes_frequencia
+
+# Timestamp, a célula com as 84 respostas, as 31 escalas em centésimos e o ID da submissão
+COLUNA_RESPOSTAS = "Respostas"
+cabecalho_compacto = ["Timestamp", COLUNA_RESPOSTAS] + list(motor.definicao_escalas) + [motor.COLUNA_ID_SUBMISSAO]
+
+_NUMERO_ESCALAS = len(motor.definicao_escalas)
+_tabela_codigos = {texto: pontos // 25 for texto, pontos in motor.pontuacao_map.items() if pontos is not None}
+
+# Tabelas de tradução entre códigos e caracteres ASCII da célula
+_codigo_para_ascii = np.full(256, ord(CARACTER_AUSENTE), dtype=np.uint8)
+_codigo_para_ascii[:5] = np.frombuffer(b"01234", dtype=np.uint8)
+_ascii_para_codigo = np.full(256, CODIGO_AUSENTE, dtype=np.uint8)
+_ascii_para_codigo[np.frombuffer(b"01234", dtype=np.uint8)] = np.arange(5, dtype=np.uint8)
+
+
+def codificar_respostas(respostas_lote):
+    """Matriz N×84 de respostas em texto (ou None) -> matriz N×84 `uint8` de códigos."""
+    matriz = motor._matriz_de_respostas(respostas_lote)
+    obter_codigo = _tabela_codigos.get
+    return np.fromiter(
+        (obter_codigo(valor, CODIGO_AUSENTE) for valor in matriz.ravel().tolist()), dtype=np.uint8, count=matriz.size
+    ).reshape(matriz.shape)
+
+
+def descodificar_respostas(codigos):
+    """Matriz de códigos -> matriz de objetos com os rótulos de resposta (None = sem resposta)."""
+    rotulos = np.array(list(rotulos_respostas) + [None], dtype=object)
+    codigos = np.asarray(codigos, dtype=np.uint8)
+    return rotulos[np.minimum(codigos, 5)]
+
+
+def pontuacoes_de_codigos(codigos):
+    """Matriz N×84 de códigos -> pontuações 0-100 (NaN = sem resposta), com a inversão da Q58 aplicada."""
+    codigos = np.asarray(codigos, dtype=np.uint8).reshape(-1, motor.TOTAL_PERGUNTAS)
+    pontuacoes = np.where(codigos == CODIGO_AUSENTE, np.nan, codigos * 25.0)
+    pontuacoes[:, motor.perguntas_invertidas] = 100 - pontuacoes[:, motor.perguntas_invertidas]
+    return pontuacoes
+
+
+def empacotar_respostas(codigos):
+    """Matriz N×84 de códigos -> lista de N textos 'c1:...' (um carácter por pergunta)."""
+    caracteres = _codigo_para_ascii[np.asarray(codigos, dtype=np.uint8).reshape(-1, motor.TOTAL_PERGUNTAS)]
+    texto = caracteres.tobytes().decode("ascii")
+    return [VERSAO_FORMATO + texto[i:i + motor.TOTAL_PERGUNTAS] for i in range(0, len(texto), motor.TOTAL_PERGUNTAS)]
+
+
+def desempacotar_respostas(textos):
+    """Lista de textos 'c1:...' -> matriz N×84 `uint8` de códigos (textos inválidos ficam sem resposta)."""
+    inicio = len(VERSAO_FORMATO)
+    blocos = []
+    for texto in textos:
+        corpo = texto[inicio:inicio + motor.TOTAL_PERGUNTAS] if isinstance(texto, str) and texto.startswith(VERSAO_FORMATO) else ""
+        blocos.append(corpo.ljust(motor.TOTAL_PERGUNTAS, CARACTER_AUSENTE))
+    bruto = np.frombuffer("".join(blocos).encode("ascii", "replace"), dtype=np.uint8)
+    return _ascii_para_codigo[bruto].reshape(-1, motor.TOTAL_PERGUNTAS)
+
+
+def formatar_celula(valor):
+    """Texto que a Planilha Google devolveria para o valor escrito numa célula."""
+    if valor is None:
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def sem_vazios_finais(valores):
+    """A linha sem as células vazias do fim, como a devolvem as leituras da Planilha Google."""
+    valores = list(valores)
+    while valores and valores[-1] == "":
+        valores.pop()
+    return valores
+
+
+def para_centesimos(valor):
+    """Pontuação de escala -> inteiro em centésimos ("" se não houver valor)."""
+    if valor is None or (isinstance(valor, float) and np.isnan(valor)):
+        return ""
+    return int(round(float(valor) * 100))
+
+
+def _de_texto_numerico(texto, divisor):
+    if texto is None or texto == "":
+        return np.nan
+    try:
+        return float(str(texto).replace(",", ".")) / divisor
+    except ValueError:
+        return np.nan
+
+
+def eh_linha_compacta(valores):
+    return len(valores) > 1 and isinstance(valores[1], str) and valores[1].startswith(VERSAO_FORMATO)
+
+
+def codificar_linha(timestamp, respostas, resultados):
+    """Linha compacta para a planilha (sem o ID, que é acrescentado pela fila de submissões)."""
+    codigos = codificar_respostas([respostas])
+    escalas = [para_centesimos(resultados.get(nome)) for nome in motor.definicao_escalas]
+    return [timestamp, empacotar_respostas(codigos)[0]] + escalas
+
+
+def para_formato_compacto(valores):
+    """Converte uma linha no formato largo original (116 ou 117 colunas) para o compacto; as compactas ficam iguais."""
+    valores = list(valores)
+    if eh_linha_compacta(valores):
+        return valores
+    linhas = descodificar_linhas([valores])
+    escalas = [para_centesimos(v) for v in linhas["escalas"][0]]
+    return [linhas["timestamps"][0], empacotar_respostas(linhas["codigos"])[0]] + escalas + [linhas["ids"][0] or ""]
+
+
+def descodificar_linhas(valores):
+    """
+    Lê linhas da planilha (texto, em qualquer um dos dois formatos) e devolve um dicionário com
+    `timestamps` (lista), `codigos` (N×84 uint8), `escalas` (N×31 float, NaN = vazio) e `ids` (lista).
+    """
+    n = len(valores)
+    codigos = np.full((n, motor.TOTAL_PERGUNTAS), CODIGO_AUSENTE, dtype=np.uint8)
+    escalas = np.full((n, _NUMERO_ESCALAS), np.nan)
+    timestamps, ids = [], []
+    compactas, largas = [], []
+    for i, linha in enumerate(valores):
+        (compactas if eh_linha_compacta(linha) else largas).append(i)
+        timestamps.append((linha[0] if linha else "") or None)
+
+    if compactas:
+        codigos[compactas] = desempacotar_respostas([valores[i][1] for i in compactas])
+    if largas:
+        codigos[largas] = codificar_respostas([valores[i][1:1 + motor.TOTAL_PERGUNTAS] for i in largas])
+
+    inicio_compacta = 2
+    inicio_larga = 1 + motor.TOTAL_PERGUNTAS
+    for i, linha in enumerate(valores):
+        compacta = eh_linha_compacta(linha)
+        inicio, divisor = (inicio_compacta, 100) if compacta else (inicio_larga, 1)
+        celulas = linha[inicio:inicio + _NUMERO_ESCALAS]
+        escalas[i, :len(celulas)] = [_de_texto_numerico(celula, divisor) for celula in celulas]
+        posicao_id = inicio + _NUMERO_ESCALAS
+        ids.append((linha[posicao_id] if len(linha) > posicao_id else "") or None)
+
+    return {"timestamps": timestamps, "codigos": codigos, "escalas": escalas, "ids": ids}
@@ -0,0 +1,64 @@
+"""
+Exportação das respostas em blocos (CSV e Parquet), sem montar a tabela inteira em memória.
+
+Os blocos vêm de `CacheDeRespostas.iterar_blocos` e são escritos um a um num ficheiro
+temporário em disco, e só o ficheiro final é lido para memória. O `st.download_button` guarda
+sempre os bytes inteiros do download, por isso o pico de memória continua a crescer com o
+número de respostas, mas é uma única cópia do ficheiro final (CSV ou Parquet comprimido), em
+vez da tabela, do texto CSV e dos bytes ao mesmo tempo.
+"""
+import tempfile
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import calculadora_copsoq as motor
+
+FORMATOS = {
+    "csv": ("text/csv", "dados_brutos_copsoq.csv"),
+    "parquet": ("application/vnd.apache.parquet", "dados_brutos_copsoq.parquet"),
+}
+
+
+# Esquema fixo, para que blocos com colunas todas vazias não mudem o tipo das colunas
+ESQUEMA_PARQUET = pa.schema(
+    [("Timestamp", pa.string())]
+    + [(f"Resp_Q{i}", pa.dictionary(pa.int8(), pa.string())) for i in range(1, motor.TOTAL_PERGUNTAS + 1)]
+    + [(nome, pa.float32()) for nome in motor.definicao_escalas]
+    + [(motor.COLUNA_ID_SUBMISSAO, pa.string())]
+)
+
+
+def gerar_csv(blocos):
+    """Gerador de bytes CSV (UTF-8), com o cabeçalho só no primeiro bloco."""
+    primeiro = True
+    for bloco in blocos:
+        yield bloco.to_csv(index=False, header=primeiro).encode('utf-8')
+        primeiro = False
+
+
+def escrever_csv(blocos, destino):
+    escritos = False
+    for pedaco in gerar_csv(blocos):
+        destino.write(pedaco)
+        escritos = True
+    return escritos
+
+
+def escrever_parquet(blocos, destino):
+    """Escreve os blocos num único ficheiro Parquet (um row group por bloco)."""
+    escrito = False
+    with pq.ParquetWriter(destino, ESQUEMA_PARQUET, compression="zstd") as escritor:
+        for bloco in blocos:
+            escritor.write_table(pa.Table.from_pandas(bloco, schema=ESQUEMA_PARQUET, preserve_index=False))
+            escrito = True
+    return escrito
+
+
+def exportar_para_bytes(blocos, formato="csv"):
+    """Escreve os blocos num ficheiro temporário (apagado no fim) e devolve o seu conteúdo."""
+    escrever = {"csv": escrever_csv, "parquet": escrever_parquet}[formato]
+    with tempfile.TemporaryFile() as ficheiro:
+        escrever(blocos, ficheiro)
+        ficheiro.seek(0)
+        return ficheiro.read()
@@ -0,0 +1,209 @@
+"""
+Fila de submissões com escrita diferida (write-behind) para a Planilha Google.
+
+Cada submissão (uma linha no formato de `codec_respostas`) é gravada primeiro num ficheiro SQLite local (a "fila") e a função
+regressa de imediato. Um descarregador em segundo plano envia depois as linhas em lotes
+com `append_rows`, com espera exponencial em caso de erro. Ao acordar com linhas novas, o
+descarregador espera ainda `espera_agrupamento` segundos e nunca envia duas vezes em menos de
+`intervalo_minimo` segundos (a não ser que já haja um lote completo): as submissões que chegam
+em rajada seguem juntas e as escritas ficam abaixo da quota da API. Cada linha leva um
+identificador único (coluna `ID_Submissao`): se um envio falhar a meio, antes de o
+repetir consulta-se essa coluna na planilha para não gravar nenhuma linha duas vezes.
+O lote é reservado numa única transação (`reservado_ate`), pelo que duas instâncias da fila
+sobre o mesmo ficheiro (por exemplo, depois de o `st.cache_resource` ser limpo) nunca enviam
+as mesmas linhas; a reserva é libertada se o envio falhar e caduca se o processo morrer.
+
+Cada linha fica associada ao fragmento do armazenamento a que se destina (ver `armazenamento`;
+"" é a folha principal) e o descarregador envia cada fragmento para a sua folha. A fila só
+depende de objetos com a API de uma worksheet do gspread, pelo que pode ser testada com
+`planilha_falsa.WorksheetFalsa`.
+"""
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+import codec_respostas as codec
+import metricas
+
+logger = logging.getLogger(__name__)
+
+# Posição (base 1) da coluna com o identificador da submissão, no formato compacto
+NUMERO_COLUNA_ID = len(codec.cabecalho_compacto)
+# Segundos durante os quais um lote em envio fica reservado para a instância que o reservou
+PRAZO_RESERVA = 300.0
+
+
+def garantir_cabecalho(worksheet):
+    """
+    Escreve o cabeçalho do formato compacto se a folha estiver vazia. Uma folha que já tenha
+    o cabeçalho do formato largo fica como está: as linhas dos dois formatos podem coexistir.
+    """
+    if not worksheet.row_values(1):
+        worksheet.update(values=[codec.cabecalho_compacto], range_name="A1")
+
+
+class FilaDeSubmissoes:
+    def __init__(self, caminho, tamanho_lote=100, espera_inicial=2.0, espera_maxima=300.0, espera_agrupamento=0.5,
+                 intervalo_minimo=5.0):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        self.tamanho_lote = tamanho_lote
+        self.espera_inicial = espera_inicial
+        self.espera_maxima = espera_maxima
+        self.espera_agrupamento = espera_agrupamento
+        self.intervalo_minimo = intervalo_minimo
+        self._ultimo_envio = float("-inf")
+        self._lock = threading.Lock()
+        self._novas = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        self._conexao.execute(
+            "CREATE TABLE IF NOT EXISTS submissoes ("
+            " ordem INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " id TEXT UNIQUE NOT NULL,"
+            " linha TEXT NOT NULL,"
+            " criado_em REAL NOT NULL,"
+            " tentativas INTEGER NOT NULL DEFAULT 0,"
+            " fragmento TEXT NOT NULL DEFAULT '',"
+            " reservado_ate REAL NOT NULL DEFAULT 0)"
+        )
+        colunas = {registo[1] for registo in self._conexao.execute("PRAGMA table_info(submissoes)")}
+        if "fragmento" not in colunas:
+            # Fila criada por uma versão anterior: as linhas pendentes vão para a folha principal
+            self._conexao.execute("ALTER TABLE submissoes ADD COLUMN fragmento TEXT NOT NULL DEFAULT ''")
+        if "reservado_ate" not in colunas:
+            self._conexao.execute("ALTER TABLE submissoes ADD COLUMN reservado_ate REAL NOT NULL DEFAULT 0")
+
+    def enfileirar(self, linha, fragmento=""):
+        """Grava a linha na fila local, destinada a `fragmento`, e devolve o identificador atribuído à submissão."""
+        id_submissao = uuid.uuid4().hex
+        linha_completa = list(linha) + [id_submissao]
+        with self._lock:
+            self._conexao.execute(
+                "INSERT INTO submissoes (id, linha, criado_em, fragmento) VALUES (?, ?, ?, ?)",
+                (id_submissao, json.dumps(linha_completa, ensure_ascii=False), time.time(), fragmento),
+            )
+        self._novas.set()
+        return id_submissao
+
+    def total_pendentes(self):
+        with self._lock:
+            return self._conexao.execute("SELECT COUNT(*) FROM submissoes").fetchone()[0]
+
+    def fragmentos_pendentes(self):
+        with self._lock:
+            return [f for (f,) in self._conexao.execute("SELECT DISTINCT fragmento FROM submissoes ORDER BY fragmento")]
+
+    def _aguardar_agrupamento(self):
+        """Dá tempo a que mais submissões se juntem às pendentes, até encher um lote."""
+        limite = max(time.monotonic() + self.espera_agrupamento, self._ultimo_envio + self.intervalo_minimo)
+        while not self._parar.is_set():
+            restante = limite - time.monotonic()
+            if restante <= 0 or not 0 < self.total_pendentes() < self.tamanho_lote:
+                return
+            self._novas.clear()
+            self._novas.wait(restante)
+
+    def _reservar_lote(self, fragmento):
+        """Reserva (numa transação) as próximas linhas de `fragmento` que nenhuma instância está a enviar."""
+        agora = time.time()
+        with self._lock:
+            self._conexao.execute("BEGIN IMMEDIATE")
+            try:
+                lote = self._conexao.execute(
+                    "SELECT id, linha, tentativas FROM submissoes WHERE fragmento = ? AND reservado_ate <= ? ORDER BY ordem LIMIT ?",
+                    (fragmento, agora, self.tamanho_lote),
+                ).fetchall()
+                self._conexao.executemany(
+                    "UPDATE submissoes SET tentativas = tentativas + 1, reservado_ate = ? WHERE id = ?",
+                    [(agora + PRAZO_RESERVA, id_submissao) for id_submissao, _, _ in lote],
+                )
+                self._conexao.execute("COMMIT")
+            except BaseException:
+                self._conexao.execute("ROLLBACK")
+                raise
+        return lote
+
+    def descarregar(self, worksheet, fragmento=""):
+        """Envia o próximo lote de linhas pendentes de `fragmento`. Devolve o número de linhas gravadas."""
+        lote = self._reservar_lote(fragmento)
+        if not lote:
+            return 0
+        try:
+            if any(tentativas for _, _, tentativas in lote):
+                # Um envio anterior falhou sem sabermos se chegou à planilha
+                ids_gravados = set(worksheet.col_values(NUMERO_COLUNA_ID))
+                ja_gravados = [id_submissao for id_submissao, _, _ in lote if id_submissao in ids_gravados]
+                self._remover(ja_gravados)
+                lote = [item for item in lote if item[0] not in ids_gravados]
+                if not lote:
+                    return 0
+
+            # Linhas ainda no formato largo (enfileiradas por uma versão anterior) seguem já compactas
+            with metricas.etapa("fila_append_rows"):
+                worksheet.append_rows([codec.para_formato_compacto(json.loads(linha)) for _, linha, _ in lote])
+        except BaseException:
+            # Sem saber se chegaram à planilha, as linhas voltam a estar livres (e a próxima tentativa verifica-o)
+            with self._lock:
+                self._conexao.executemany("UPDATE submissoes SET reservado_ate = 0 WHERE id = ?", [(i,) for i, _, _ in lote])
+            raise
+        ids = [id_submissao for id_submissao, _, _ in lote]
+        self._ultimo_envio = time.monotonic()
+        self._remover(ids)
+        metricas.contar("submissoes_enviadas", len(ids))
+        return len(ids)
+
+    def _remover(self, ids):
+        if ids:
+            with self._lock:
+                self._conexao.executemany("DELETE FROM submissoes WHERE id = ?", [(i,) for i in ids])
+
+    def iniciar_descarregador(self, abrir_worksheet, intervalo=5.0):
+        """
+        Arranca a thread que esvazia a fila. `abrir_worksheet(fragmento)` é chamada para obter
+        a folha de cada fragmento (e de novo após um erro); o cabeçalho é verificado quando a
+        folha é aberta pela primeira vez.
+        """
+        if self._thread is not None:
+            return
+
+        def ciclo():
+            folhas = {}
+            espera = self.espera_inicial
+            while not self._parar.is_set():
+                self._novas.clear()
+                try:
+                    self._aguardar_agrupamento()
+                    for fragmento in self.fragmentos_pendentes():
+                        if fragmento not in folhas:
+                            worksheet = abrir_worksheet(fragmento)
+                            garantir_cabecalho(worksheet)
+                            folhas[fragmento] = worksheet
+                        while self.descarregar(folhas[fragmento], fragmento):
+                            pass
+                    espera = self.espera_inicial
+                    self._novas.wait(intervalo)
+                except Exception:
+                    metricas.contar("fila_erros_envio")
+                    logger.exception("Falha ao enviar submissões para a planilha; nova tentativa em %.0fs", espera)
+                    folhas.clear()
+                    self._parar.wait(espera + random.uniform(0, espera / 2))
+                    espera = min(espera * 2, self.espera_maxima)
+
+        self._thread = threading.Thread(target=ciclo, name="descarregador-submissoes", daemon=True)
+        self._thread.start()
+
+    def parar(self, tempo_limite=None):
+        self._parar.set()
+        self._novas.set()
+        if self._thread is not None:
+            self._thread.join(tempo_limite)
+            self._thread = None
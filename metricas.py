@@ -0,0 +1,227 @@
+"""
+Instrumentação dos caminhos críticos: tempos por etapa, contadores e chamadas à API do Google.
+
+Liga-se com a variável de ambiente `COPSOQ_METRICAS=1`. Desligada, `cronometrado` devolve a
+própria função e `etapa` devolve sempre o mesmo contexto vazio, pelo que o custo é praticamente
+nulo. Com `COPSOQ_METRICAS_FICHEIRO=<caminho>`, as métricas são também gravadas periodicamente
+nesse ficheiro no formato de texto do Prometheus (para o node_exporter "textfile" ou para consulta).
+
+As chamadas ao gspread são contadas no ponto único por onde passam todos os pedidos HTTP
+(`Client.http_client.request`), por tipo de pedido, e comparadas com a quota por minuto da
+API do Google Sheets.
+"""
+import collections
+import contextlib
+import functools
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+ATIVO = os.environ.get("COPSOQ_METRICAS", "").lower() in ("1", "true", "sim")
+CAMINHO_FICHEIRO = os.environ.get("COPSOQ_METRICAS_FICHEIRO")
+INTERVALO_FICHEIRO = 15.0
+
+# Quota da API do Google Sheets por utilizador (conta de serviço) e por minuto
+LIMITES_POR_MINUTO = {"leitura": 60, "escrita": 60}
+AMOSTRAS_POR_ETAPA = 500
+
+_lock = threading.Lock()
+_etapas = {}
+_contadores = collections.Counter()
+_chamadas_api = collections.Counter()
+_janela_api = {tipo: collections.deque() for tipo in LIMITES_POR_MINUTO}
+_NULO = contextlib.nullcontext()
+
+
+class _EstatisticaEtapa:
+    def __init__(self):
+        self.contagem = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.ultimo = 0.0
+        self.amostras = collections.deque(maxlen=AMOSTRAS_POR_ETAPA)
+
+    def registar(self, segundos):
+        self.contagem += 1
+        self.total += segundos
+        self.maximo = max(self.maximo, segundos)
+        self.ultimo = segundos
+        self.amostras.append(segundos)
+
+    def quantil(self, q):
+        ordenadas = sorted(self.amostras)
+        return ordenadas[min(int(q * len(ordenadas)), len(ordenadas) - 1)] if ordenadas else 0.0
+
+
+def registar_tempo(nome, segundos):
+    with _lock:
+        _etapas.setdefault(nome, _EstatisticaEtapa()).registar(segundos)
+
+
+@contextlib.contextmanager
+def _cronometro(nome):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registar_tempo(nome, time.perf_counter() - inicio)
+
+
+def etapa(nome):
+    """Contexto que mede o tempo do bloco `with` (não faz nada com a instrumentação desligada)."""
+    return _cronometro(nome) if ATIVO else _NULO
+
+
+def cronometrado(nome=None):
+    """Decorador que mede o tempo de cada chamada da função; desligado, devolve a função original."""
+    def decorar(funcao):
+        if not ATIVO:
+            return funcao
+        nome_etapa = nome or funcao.__name__
+
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            with _cronometro(nome_etapa):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorar
+
+
+def contar(nome, quantidade=1):
+    if ATIVO:
+        with _lock:
+            _contadores[nome] += quantidade
+
+
+# Ações da API do Sheets que aparecem no fim do URL (".../values/A1:append")
+_ACOES_API = {
+    "append", "clear", "batchGet", "batchUpdate", "batchClear", "copyTo",
+    "batchGetByDataFilter", "batchUpdateByDataFilter", "batchClearByDataFilter",
+}
+
+
+def _tipo_do_pedido(metodo, endpoint):
+    """Ex.: ('POST', '.../values/A1:append') -> 'append'; ('GET', '.../values/A2:AH') -> 'values.get'."""
+    caminho = urlparse(endpoint).path.rstrip("/")
+    acao = caminho.rsplit(":", 1)[-1] if ":" in caminho else ""
+    if acao in _ACOES_API:
+        return acao
+    recurso = "values" if "/values/" in caminho else "spreadsheets" if "/spreadsheets" in caminho else "drive"
+    return f"{recurso}.{metodo.lower()}"
+
+
+def registar_chamada_api(metodo, endpoint):
+    tipo = _tipo_do_pedido(metodo, endpoint)
+    categoria = "leitura" if metodo.upper() == "GET" else "escrita"
+    agora = time.monotonic()
+    with _lock:
+        _chamadas_api[(categoria, tipo)] += 1
+        janela = _janela_api[categoria]
+        janela.append(agora)
+        while janela and janela[0] < agora - 60:
+            janela.popleft()
+
+
+def instrumentar_cliente(gc):
+    """Faz com que todos os pedidos HTTP do cliente gspread sejam contados. Desligado, não altera o cliente."""
+    if not ATIVO:
+        return gc
+    alvo = getattr(gc, "http_client", gc)  # gspread 6 (http_client) ou 5 (Client.request)
+    pedido_original = getattr(alvo, "request", None)
+    if pedido_original is None or getattr(pedido_original, "_instrumentado", False):
+        return gc
+
+    @functools.wraps(pedido_original)
+    def pedido(method, endpoint, *args, **kwargs):
+        registar_chamada_api(method, endpoint)
+        with _cronometro(f"gspread_{'leitura' if method.upper() == 'GET' else 'escrita'}"):
+            return pedido_original(method, endpoint, *args, **kwargs)
+
+    pedido._instrumentado = True
+    alvo.request = pedido
+    return gc
+
+
+def uso_quota():
+    """{categoria: (chamadas no último minuto, limite por minuto)}."""
+    agora = time.monotonic()
+    with _lock:
+        for janela in _janela_api.values():
+            while janela and janela[0] < agora - 60:
+                janela.popleft()
+        return {categoria: (len(_janela_api[categoria]), limite) for categoria, limite in LIMITES_POR_MINUTO.items()}
+
+
+def instantaneo():
+    """Cópia das métricas atuais: etapas, contadores e chamadas à API."""
+    with _lock:
+        etapas = {
+            nome: {
+                "contagem": e.contagem, "total": e.total, "media": e.total / e.contagem if e.contagem else 0.0,
+                "p50": e.quantil(0.5), "p95": e.quantil(0.95), "maximo": e.maximo, "ultimo": e.ultimo,
+            }
+            for nome, e in _etapas.items()
+        }
+        contadores = dict(_contadores)
+        chamadas = dict(_chamadas_api)
+    return {"etapas": etapas, "contadores": contadores, "chamadas_api": chamadas, "quota": uso_quota()}
+
+
+def _rotulo(texto):
+    return texto.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def para_prometheus():
+    """Métricas no formato de exposição de texto do Prometheus."""
+    dados = instantaneo()
+    linhas = [
+        "# HELP copsoq_etapa_segundos Tempo de execucao por etapa.",
+        "# TYPE copsoq_etapa_segundos summary",
+    ]
+    for nome, e in sorted(dados["etapas"].items()):
+        rotulo = f'etapa="{_rotulo(nome)}"'
+        linhas.append(f'copsoq_etapa_segundos{{{rotulo},quantile="0.5"}} {e["p50"]:.6f}')
+        linhas.append(f'copsoq_etapa_segundos{{{rotulo},quantile="0.95"}} {e["p95"]:.6f}')
+        linhas.append(f"copsoq_etapa_segundos_sum{{{rotulo}}} {e['total']:.6f}")
+        linhas.append(f"copsoq_etapa_segundos_count{{{rotulo}}} {e['contagem']}")
+    linhas += ["# HELP copsoq_eventos_total Contadores de eventos.", "# TYPE copsoq_eventos_total counter"]
+    for nome, valor in sorted(dados["contadores"].items()):
+        linhas.append(f'copsoq_eventos_total{{evento="{_rotulo(nome)}"}} {valor}')
+    linhas += ["# HELP copsoq_gspread_chamadas_total Pedidos a API do Google por tipo.", "# TYPE copsoq_gspread_chamadas_total counter"]
+    for (categoria, tipo), valor in sorted(dados["chamadas_api"].items()):
+        linhas.append(f'copsoq_gspread_chamadas_total{{categoria="{categoria}",tipo="{_rotulo(tipo)}"}} {valor}')
+    linhas += [
+        "# HELP copsoq_gspread_chamadas_ultimo_minuto Pedidos a API do Google nos ultimos 60 segundos.",
+        "# TYPE copsoq_gspread_chamadas_ultimo_minuto gauge",
+    ]
+    for categoria, (usadas, limite) in sorted(dados["quota"].items()):
+        linhas.append(f'copsoq_gspread_chamadas_ultimo_minuto{{categoria="{categoria}"}} {usadas}')
+        linhas.append(f'copsoq_gspread_quota_por_minuto{{categoria="{categoria}"}} {limite}')
+    return "\n".join(linhas) + "\n"
+
+
+def gravar_prometheus(caminho):
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "w", encoding="utf-8") as ficheiro:
+        ficheiro.write(para_prometheus())
+    os.replace(temporario, caminho)
+
+
+def _gravar_periodicamente():
+    while True:
+        time.sleep(INTERVALO_FICHEIRO)
+        try:
+            gravar_prometheus(CAMINHO_FICHEIRO)
+        except OSError:
+            logger.exception("Não foi possível gravar as métricas em %s", CAMINHO_FICHEIRO)
+
+
+if ATIVO and CAMINHO_FICHEIRO:
+    threading.Thread(target=_gravar_periodicamente, name="metricas-ficheiro", daemon=True).start()
@@ -0,0 +1,86 @@
+"""
+Migra a planilha de resultados do formato largo original (uma célula por resposta,
+117 colunas) para o formato compacto de `codec_respostas` (34 colunas).
+
+Antes de reescrever a folha, guarda uma cópia dela na mesma planilha (a não ser que se
+use --sem-copia). As linhas são reescritas no mesmo sítio, por lotes, sem apagar a folha:
+as que a aplicação acrescentar entretanto (já no formato compacto) ficam como estão e, se
+a migração parar a meio, a folha fica com linhas dos dois formatos, que a aplicação lê, e
+basta voltar a correr o comando. Só no fim se escreve o cabeçalho novo e se reduz o número
+de colunas da folha, libertando as células para o limite da Planilha Google. O cache local
+da aplicação deteta a mudança e reconstrói-se sozinho na sincronização seguinte.
+
+Uso:
+    python migrar_planilha.py                       # credenciais de .streamlit/secrets.toml
+    python migrar_planilha.py --credenciais conta.json --planilha Resultados_COPSOQ
+"""
+import argparse
+import sys
+import tomllib
+from datetime import datetime
+
+import gspread
+
+import codec_respostas as codec
+
+NOME_DA_SUA_PLANILHA = 'Resultados_COPSOQ'
+CAMINHO_SECRETS = ".streamlit/secrets.toml"
+
+
+def migrar_worksheet(worksheet, tamanho_lote=10_000, criar_copia=True):
+    """
+    Reescreve a folha no formato compacto, linha a linha no mesmo sítio (as linhas vazias
+    ficam vazias). Devolve um dicionário com o resumo da migração.
+    """
+    largura = len(codec.cabecalho_compacto)
+    valores = worksheet.get_all_values()
+    linhas = [linha for linha in valores[1:] if any(linha)]
+    compactas = [codec.para_formato_compacto(linha)[:largura] if any(linha) else [""] * largura for linha in valores[1:]]
+
+    copia = None
+    if criar_copia:
+        copia = worksheet.duplicate(new_sheet_name=f"Cópia formato largo {datetime.now():%Y-%m-%d %H%M}")
+
+    for inicio in range(0, len(compactas), tamanho_lote):
+        worksheet.update(values=compactas[inicio:inicio + tamanho_lote], range_name=f"A{inicio + 2}")
+    # O cabeçalho e a redução das colunas só depois de todas as linhas estarem no formato compacto
+    worksheet.update(values=[codec.cabecalho_compacto], range_name="A1")
+    worksheet.resize(cols=largura)
+
+    return {
+        "linhas": len(linhas),
+        "ja_compactas": sum(codec.eh_linha_compacta(linha) for linha in linhas),
+        "caracteres_antes": sum(len(celula) for linha in linhas for celula in linha),
+        "caracteres_depois": sum(len(str(celula)) for linha in compactas for celula in linha),
+        "copia": copia.title if copia is not None else None,
+    }
+
+
+def conectar(caminho_credenciais=None):
+    if caminho_credenciais:
+        return gspread.service_account(filename=caminho_credenciais)
+    with open(CAMINHO_SECRETS, "rb") as ficheiro:
+        creds = dict(tomllib.load(ficheiro)["gcp_service_account"])
+    creds["private_key"] = creds["private_key"].replace("\\n", "\n")
+    return gspread.service_account_from_dict(creds)
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--credenciais", help="ficheiro JSON da conta de serviço (por omissão, usa os Secrets do Streamlit)")
+    parser.add_argument("--planilha", default=NOME_DA_SUA_PLANILHA)
+    parser.add_argument("--sem-copia", action="store_true", help="não guardar uma cópia da folha antes de a reescrever")
+    args = parser.parse_args(argumentos)
+
+    worksheet = conectar(args.credenciais).open(args.planilha).sheet1
+    resumo = migrar_worksheet(worksheet, criar_copia=not args.sem_copia)
+    print(f"{resumo['linhas']} linhas migradas ({resumo['ja_compactas']} já estavam no formato compacto).")
+    if resumo["linhas"]:
+        print(f"Tamanho do texto: {resumo['caracteres_antes']} -> {resumo['caracteres_depois']} caracteres.")
+    if resumo["copia"]:
+        print(f"Cópia da folha original: '{resumo['copia']}'.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
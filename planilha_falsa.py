@@ -0,0 +1,257 @@
+"""
+Substituto local (em memória) do cliente gspread, usado em testes e benchmarks.
+
+Implementa apenas a parte da API do gspread usada pela aplicação: `Client.open` / `create` /
+`list_spreadsheet_files`, `Spreadsheet.sheet1` / `worksheet` / `add_worksheet` e, nas folhas, `get_all_values`,
+`get`, `row_values`, `col_values`, `update`, `append_row`, `append_rows`, `clear`,
+`resize` e `duplicate`.
+Tal como na Planilha Google, os valores são devolvidos sempre como texto.
+
+Com um `LimitadorDeQuota`, o cliente comporta-se como a API sob carga: cada pedido demora
+(latência sorteada) e os pedidos acima da quota por minuto falham com o erro 429.
+"""
+import collections
+import json
+import random
+import re
+import threading
+import time
+
+import gspread
+import requests
+
+import codec_respostas as codec
+
+# Métodos que na API real são leituras; os restantes contam como escritas
+_METODOS_LEITURA = {"get_all_values", "get", "row_values", "col_values", "open", "sheet1", "worksheets", "worksheet", "list_spreadsheet_files"}
+
+
+def _indice_coluna(letras):
+    indice = 0
+    for letra in letras.upper():
+        indice = indice * 26 + (ord(letra) - ord("A") + 1)
+    return indice
+
+
+def _interpretar_intervalo(intervalo):
+    """Converte 'A2:DM' ou 'B3' em (linha_inicial, coluna_inicial, linha_final, coluna_final), base 1."""
+    partes = intervalo.split("!")[-1].split(":")
+    limites = []
+    for parte in partes:
+        letras, numero = re.fullmatch(r"([A-Za-z]*)(\d*)", parte).groups()
+        limites.append((int(numero) if numero else None, _indice_coluna(letras) if letras else None))
+    (linha_ini, col_ini), (linha_fim, col_fim) = limites[0], limites[-1]
+    return linha_ini or 1, col_ini or 1, linha_fim, col_fim
+
+
+class LimitadorDeQuota:
+    """
+    Quotas por minuto (janela deslizante, partilhada por todo o cliente, como a quota por
+    utilizador da API) e latência dos pedidos, sorteada de uma lognormal com a mediana indicada.
+    `escala_tempo` encolhe o minuto e as latências na mesma proporção (10 = um minuto dura 6 s),
+    para testes de carga mais curtos.
+    """
+
+    def __init__(self, leituras_por_minuto=60, escritas_por_minuto=60, latencia_leitura=0.15,
+                 latencia_escrita=0.4, escala_tempo=1.0, semente=None):
+        self.limites = {"leitura": leituras_por_minuto, "escrita": escritas_por_minuto}
+        self.latencias = {"leitura": latencia_leitura, "escrita": latencia_escrita}
+        self.escala_tempo = escala_tempo
+        self.ativo = True
+        self.aceites = collections.Counter()
+        self.recusados = collections.Counter()
+        self._janelas = {categoria: collections.deque() for categoria in self.limites}
+        self._aleatorio = random.Random(semente)
+        self._lock = threading.Lock()
+
+    def pedido(self, metodo):
+        """Regista um pedido à API: espera a latência e falha com o erro 429 se a quota se esgotou."""
+        if not self.ativo:
+            return
+        categoria = "leitura" if metodo in _METODOS_LEITURA else "escrita"
+        agora = time.monotonic()
+        with self._lock:
+            janela = self._janelas[categoria]
+            while janela and janela[0] <= agora - 60 / self.escala_tempo:
+                janela.popleft()
+            aceite = len(janela) < self.limites[categoria]
+            if aceite:
+                janela.append(agora)
+                self.aceites[categoria] += 1
+            else:
+                self.recusados[categoria] += 1
+            latencia = self._aleatorio.lognormvariate(0, 0.5) * self.latencias[categoria] / self.escala_tempo
+        # Um pedido recusado responde mais depressa do que um que chega a ser executado
+        time.sleep(latencia if aceite else latencia / 3)
+        if not aceite:
+            resposta = requests.models.Response()
+            resposta.status_code = 429
+            resposta._content = json.dumps({"error": {
+                "code": 429,
+                "message": f"Quota exceeded for quota metric '{categoria}' (simulada).",
+                "status": "RESOURCE_EXHAUSTED",
+            }}).encode("utf-8")
+            raise gspread.exceptions.APIError(resposta)
+
+
+class WorksheetFalsa:
+    def __init__(self, titulo="Sheet1", planilha=None):
+        self.title = titulo
+        self.spreadsheet = planilha
+        self.col_count = 26
+        self._linhas = []
+        self._lock = threading.Lock()
+        self.chamadas = {}
+
+    def _registar(self, metodo):
+        self.chamadas[metodo] = self.chamadas.get(metodo, 0) + 1
+        if self.spreadsheet is not None and self.spreadsheet.limitador is not None:
+            self.spreadsheet.limitador.pedido(metodo)
+
+    def carregar_valores(self, valores):
+        """Substitui o conteúdo da folha por `valores` (listas de texto), sem passar pela API simulada."""
+        with self._lock:
+            self._linhas = [list(linha) for linha in valores]
+
+    @property
+    def row_count(self):
+        return len(self._linhas)
+
+    def get_all_values(self):
+        self._registar("get_all_values")
+        with self._lock:
+            largura = max((len(linha) for linha in self._linhas), default=0)
+            return [linha + [""] * (largura - len(linha)) for linha in self._linhas]
+
+    def get(self, range_name=None, **_):
+        self._registar("get")
+        if range_name is None:
+            return self.get_all_values()
+        linha_ini, col_ini, linha_fim, col_fim = _interpretar_intervalo(range_name)
+        with self._lock:
+            linhas = self._linhas[linha_ini - 1:linha_fim]
+            resultado = [linha[col_ini - 1:col_fim] for linha in linhas]
+        while resultado and not any(resultado[-1]):
+            resultado.pop()
+        return resultado
+
+    def row_values(self, linha):
+        self._registar("row_values")
+        with self._lock:
+            valores = list(self._linhas[linha - 1]) if linha <= len(self._linhas) else []
+        return codec.sem_vazios_finais(valores)
+
+    def col_values(self, coluna):
+        self._registar("col_values")
+        with self._lock:
+            valores = [linha[coluna - 1] if coluna <= len(linha) else "" for linha in self._linhas]
+        return codec.sem_vazios_finais(valores)
+
+    def update(self, values=None, range_name=None, **_):
+        self._registar("update")
+        linha_ini, col_ini, _, _ = _interpretar_intervalo(range_name or "A1")
+        with self._lock:
+            for deslocamento, valores in enumerate(values):
+                indice = linha_ini - 1 + deslocamento
+                while len(self._linhas) <= indice:
+                    self._linhas.append([])
+                linha = self._linhas[indice]
+                fim = col_ini - 1 + len(valores)
+                if len(linha) < fim:
+                    linha.extend([""] * (fim - len(linha)))
+                linha[col_ini - 1:fim] = [codec.formatar_celula(v) for v in valores]
+        return {}
+
+    def append_row(self, values, **kwargs):
+        self._registar("append_row")
+        return self._acrescentar([values])
+
+    def append_rows(self, values, **kwargs):
+        self._registar("append_rows")
+        return self._acrescentar(values)
+
+    def clear(self):
+        self._registar("clear")
+        with self._lock:
+            self._linhas = []
+        return {}
+
+    def resize(self, rows=None, cols=None):
+        self._registar("resize")
+        if cols is not None:
+            with self._lock:
+                self.col_count = cols
+                self._linhas = [linha[:cols] for linha in self._linhas]
+        return {}
+
+    def duplicate(self, new_sheet_name=None, **_):
+        self._registar("duplicate")
+        copia = self.spreadsheet.add_worksheet(new_sheet_name or f"Cópia de {self.title}")
+        copia.carregar_valores(self._linhas)
+        return copia
+
+    def _acrescentar(self, linhas):
+        with self._lock:
+            # Tal como a API, acrescenta depois da última linha com dados
+            while self._linhas and not any(self._linhas[-1]):
+                self._linhas.pop()
+            self._linhas.extend([codec.formatar_celula(v) for v in linha] for linha in linhas)
+        return {}
+
+
+class PlanilhaFalsa:
+    def __init__(self, titulo, limitador=None):
+        self.title = titulo
+        self.limitador = limitador
+        self._folhas = [WorksheetFalsa(planilha=self)]
+
+    def _pedido(self, metodo):
+        if self.limitador is not None:
+            self.limitador.pedido(metodo)
+
+    @property
+    def sheet1(self):
+        self._pedido("sheet1")
+        return self._folhas[0]
+
+    def worksheets(self):
+        self._pedido("worksheets")
+        return list(self._folhas)
+
+    def worksheet(self, titulo):
+        self._pedido("worksheet")
+        for folha in self._folhas:
+            if folha.title == titulo:
+                return folha
+        raise gspread.exceptions.WorksheetNotFound(titulo)
+
+    def add_worksheet(self, title, rows=1000, cols=26, **_):
+        self._pedido("add_worksheet")
+        folha = WorksheetFalsa(title, planilha=self)
+        self._folhas.append(folha)
+        return folha
+
+
+class ClienteFalso:
+    def __init__(self, *nomes_planilhas, limitador=None):
+        self.limitador = limitador
+        self._planilhas = {nome: PlanilhaFalsa(nome, limitador) for nome in nomes_planilhas}
+
+    def _pedido(self, metodo):
+        if self.limitador is not None:
+            self.limitador.pedido(metodo)
+
+    def open(self, nome):
+        self._pedido("open")
+        if nome not in self._planilhas:
+            raise gspread.exceptions.SpreadsheetNotFound(nome)
+        return self._planilhas[nome]
+
+    def create(self, nome, folder_id=None):
+        self._pedido("create")
+        self._planilhas[nome] = PlanilhaFalsa(nome, self.limitador)
+        return self._planilhas[nome]
+
+    def list_spreadsheet_files(self, title=None, folder_id=None):
+        self._pedido("list_spreadsheet_files")
+        return [{"id": nome, "name": nome} for nome in self._planilhas if title is None or nome == title]
@@ -0,0 +1,234 @@
+"""
+Indicadores psicométricos por escala, calculados a partir das respostas (Resp_Q*):
+- alfa de Cronbach de cada escala com mais de um item;
+- correlação item-total corrigida de cada item (item contra a soma dos restantes itens da escala);
+- intervalo de confiança bootstrap (percentis) da média de cada escala.
+
+Tudo é vetorizado sobre os respondentes. No bootstrap, cada reamostragem é uma linha de uma
+matriz de contagens (quantas vezes cada respondente foi sorteado), pelo que as médias das
+31 escalas saem de um único produto de matrizes. As reamostragens são divididas em tarefas
+de tamanho fixo, cada uma com a sua semente (derivada de `semente`), e repartidas por um
+conjunto de processos: o resultado é o mesmo para os mesmos dados e parâmetros, seja qual
+for o número de processos. Os processos são criados com "spawn" e não com fork, porque o
+processo do Streamlit tem threads (a fila, o cache) cujos locks um fork poderia copiar fechados.
+
+Só o resultado da versão mais recente dos dados (ver `CacheDeRespostas.versao`) fica
+guardado em disco; `analise_em_segundo_plano` calcula-o numa thread, para o painel não
+ficar bloqueado.
+"""
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+import warnings
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+import calculadora_copsoq as motor
+import codec_respostas as codec
+import metricas
+
+DIRETORIO_CACHE = os.path.join(os.environ.get("COPSOQ_DIRETORIO_DADOS", ".copsoq_dados"), "psicometria")
+# Número máximo de células (reamostragens × respondentes) da matriz de contagens em memória de cada vez
+CELULAS_POR_BLOCO = 4_000_000
+# Abaixo deste número de células no total, o bootstrap corre no próprio processo
+CELULAS_MINIMAS_PARALELO = 20_000_000
+REAMOSTRAGENS_POR_TAREFA = 250
+# Depois de um erro, o cálculo só é repetido passado este tempo (em segundos); até lá o painel mostra o erro
+ESPERA_APOS_ERRO = 300.0
+
+_lock = threading.Lock()
+_em_curso = {}
+_falhas = {}
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="psicometria")
+
+
+def alfa_de_cronbach(itens):
+    """Alfa de Cronbach de uma matriz N×k de pontuações sem NaN (NaN se k < 2 ou N < 2)."""
+    itens = np.asarray(itens, dtype=float)
+    n, k = itens.shape
+    if k < 2 or n < 2:
+        return float("nan")
+    variancia_total = itens.sum(axis=1).var(ddof=1)
+    if variancia_total == 0:
+        return float("nan")
+    return float(k / (k - 1) * (1 - itens.var(axis=0, ddof=1).sum() / variancia_total))
+
+
+def correlacoes_item_total(itens):
+    """Correlação de cada item com a soma dos restantes (vetor de k valores; NaN se k < 2)."""
+    itens = np.asarray(itens, dtype=float)
+    n, k = itens.shape
+    if k < 2 or n < 2:
+        return np.full(k, np.nan)
+    restantes = itens.sum(axis=1, keepdims=True) - itens
+    itens_c = itens - itens.mean(axis=0)
+    restantes_c = restantes - restantes.mean(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (itens_c * restantes_c).sum(axis=0) / np.sqrt((itens_c ** 2).sum(axis=0) * (restantes_c ** 2).sum(axis=0))
+
+
+def _medias_reamostradas(argumentos):
+    """
+    Médias das escalas em `reamostragens` reamostras (com reposição) dos respondentes.
+    `escalas` é N×E com NaN nas escalas sem resposta; devolve uma matriz reamostragens×E.
+    """
+    escalas, reamostragens, semente = argumentos
+    n = escalas.shape[0]
+    respondidas = ~np.isnan(escalas)
+    valores = np.where(respondidas, escalas, 0).astype(np.float64)
+    respondidas = respondidas.astype(np.float64)
+    gerador = np.random.default_rng(semente)
+    bloco = max(1, min(reamostragens, CELULAS_POR_BLOCO // n))
+    medias = np.empty((reamostragens, escalas.shape[1]))
+    for inicio in range(0, reamostragens, bloco):
+        b = min(bloco, reamostragens - inicio)
+        sorteados = gerador.integers(0, n, size=(b, n)) + (np.arange(b) * n)[:, None]
+        contagens = np.bincount(sorteados.ravel(), minlength=b * n).reshape(b, n).astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            medias[inicio:inicio + b] = (contagens @ valores) / (contagens @ respondidas)
+    return medias
+
+
+def intervalos_bootstrap(escalas, reamostragens=2000, nivel=0.95, semente=0, max_processos=None):
+    """
+    Intervalos de confiança bootstrap (percentis) da média de cada coluna de `escalas` (N×E,
+    NaN = sem resposta). Devolve (inferior, superior), dois vetores de E valores.
+    """
+    escalas = np.asarray(escalas, dtype=np.float32)
+    if escalas.shape[0] < 2:
+        vazio = np.full(escalas.shape[1], np.nan)
+        return vazio, vazio.copy()
+    tamanhos = [min(REAMOSTRAGENS_POR_TAREFA, reamostragens - i) for i in range(0, reamostragens, REAMOSTRAGENS_POR_TAREFA)]
+    tarefas = [(escalas, tamanho, s) for tamanho, s in zip(tamanhos, np.random.SeedSequence(semente).spawn(len(tamanhos)))]
+    processos = min(max_processos or os.cpu_count() or 1, len(tarefas))
+    if processos <= 1 or escalas.shape[0] * reamostragens < CELULAS_MINIMAS_PARALELO:
+        medias = np.vstack([_medias_reamostradas(tarefa) for tarefa in tarefas])
+    else:
+        with ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context("spawn")) as executor:
+            medias = np.vstack(list(executor.map(_medias_reamostradas, tarefas)))
+    alfa = (1 - nivel) / 2
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # escalas sem nenhuma resposta
+        inferior, superior = np.nanquantile(medias, [alfa, 1 - alfa], axis=0)
+    return inferior, superior
+
+
+@metricas.cronometrado("psicometria_analisar")
+def analisar(codigos, reamostragens=2000, nivel=0.95, semente=0, max_processos=None):
+    """
+    Calcula os indicadores de todas as escalas a partir de uma matriz N×84 de códigos de
+    resposta (`codec_respostas`). Devolve um dicionário serializável em JSON com as listas
+    "escalas" (uma entrada por escala) e "itens" (uma entrada por pergunta).
+    """
+    pontuacoes = codec.pontuacoes_de_codigos(codigos)
+    escalas = motor.calcular_escalas_lote(pontuacoes)
+    inferior, superior = intervalos_bootstrap(escalas, reamostragens, nivel, semente, max_processos)
+
+    resultado_escalas, resultado_itens = [], []
+    for coluna, (nome, perguntas) in enumerate(motor.definicao_escalas.items()):
+        itens = pontuacoes[:, perguntas]
+        completos = itens[~np.isnan(itens).any(axis=1)]
+        correlacoes = correlacoes_item_total(completos)
+        media = np.nanmean(escalas[:, coluna]) if np.any(~np.isnan(escalas[:, coluna])) else np.nan
+        resultado_escalas.append({
+            "Escala": nome,
+            "Itens": len(perguntas),
+            "Respostas completas": int(len(completos)),
+            "Alfa de Cronbach": alfa_de_cronbach(completos),
+            "Média": float(media),
+            "IC inferior": float(inferior[coluna]),
+            "IC superior": float(superior[coluna]),
+        })
+        for pergunta, correlacao in zip(perguntas, correlacoes):
+            resultado_itens.append({"Escala": nome, "Pergunta": pergunta + 1, "Correlação item-total": float(correlacao)})
+
+    return {
+        "total_respostas": int(len(pontuacoes)),
+        "reamostragens": reamostragens,
+        "nivel": nivel,
+        "escalas": resultado_escalas,
+        "itens": resultado_itens,
+    }
+
+
+def chave_da_analise(versao, reamostragens=2000, nivel=0.95, semente=0):
+    texto = json.dumps([versao, reamostragens, nivel, semente])
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:32]
+
+
+def _caminho(chave):
+    return os.path.join(DIRETORIO_CACHE, f"analise_{chave}.json")
+
+
+def _ler_cache(chave):
+    try:
+        with open(_caminho(chave), encoding="utf-8") as ficheiro:
+            return json.load(ficheiro)
+    except (OSError, ValueError):
+        return None
+
+
+def _gravar_cache(chave, resultado):
+    os.makedirs(DIRETORIO_CACHE, exist_ok=True)
+    temporario = f"{_caminho(chave)}.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as ficheiro:
+        json.dump(resultado, ficheiro, ensure_ascii=False, allow_nan=True)
+    os.replace(temporario, _caminho(chave))
+    # Os resultados das versões anteriores já não voltam a ser pedidos
+    for caminho in glob.glob(os.path.join(DIRETORIO_CACHE, "analise_*.json")):
+        if caminho != _caminho(chave):
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+
+
+def analise_em_segundo_plano(versao, carregar_codigos, reamostragens=2000, nivel=0.95, semente=0, max_processos=None):
+    """
+    Devolve um `Future` com o resultado de `analisar` para a versão dos dados `versao`.
+    Se já estiver em disco, o Future vem concluído; senão, `carregar_codigos()` e o cálculo
+    correm numa thread (um cálculo de cada vez e nunca dois para a mesma versão).
+    Se o cálculo falhar, devolve o mesmo Future (com a exceção) durante `ESPERA_APOS_ERRO`.
+    """
+    chave = chave_da_analise(versao, reamostragens, nivel, semente)
+    with _lock:
+        if chave in _em_curso:
+            falhou_em = _falhas.get(chave)
+            if falhou_em is None or time.monotonic() - falhou_em < ESPERA_APOS_ERRO:
+                return _em_curso[chave]
+        resultado = _ler_cache(chave)
+        if resultado is not None:
+            futuro = Future()
+            futuro.set_result(resultado)
+            return futuro
+        # As falhas de outras versões (e as suas exceções, que podem segurar os dados) já não interessam
+        for antiga in list(_falhas):
+            _falhas.pop(antiga)
+            _em_curso.pop(antiga, None)
+
+        def calcular():
+            resultado = analisar(carregar_codigos(), reamostragens, nivel, semente, max_processos)
+            _gravar_cache(chave, resultado)
+            return resultado
+
+        futuro = _executor.submit(calcular)
+        _em_curso[chave] = futuro
+    # Fora do lock: se o cálculo já tiver terminado, o callback corre logo nesta thread
+    futuro.add_done_callback(lambda concluido: _concluido(chave, concluido))
+    return futuro
+
+
+def _concluido(chave, futuro):
+    """Com sucesso, o resultado passa a vir do disco; depois de um erro, fica o Future com a exceção."""
+    with _lock:
+        if _em_curso.get(chave) is not futuro:
+            return
+        if futuro.exception() is None:
+            del _em_curso[chave]
+        else:
+            _falhas[chave] = time.monotonic()
@@ -0,0 +1,292 @@
+"""
+Geração dos relatórios PDF do COPSOQ III.
+
+- O logotipo é descarregado e descodificado uma única vez por processo; a cópia fica
+  guardada em disco e é usada quando não há ligação à internet. Sem nenhuma das duas, usa-se
+  o logotipo que vem com a aplicação (`recursos/logo_copsoq.png`) e a transferência volta a
+  ser tentada mais tarde.
+- O gráfico de barras é exportado para PNG com o `kaleido` e embebido no relatório;
+  a imagem fica em cache pelo hash dos dados.
+- O PDF final fica em cache em disco pelo hash dos dados agregados, pelo que
+  reruns do Streamlit com os mesmos dados não voltam a gerar o documento. Um relatório a que
+  falte o gráfico não fica em cache, e o logotipo de recurso entra no nome do ficheiro.
+- `descartar_versoes_antigas` apaga os relatórios e gráficos em cache quando os dados mudam.
+- `gerar_relatorios_em_lote` gera vários relatórios (por campanha, por período, ...)
+  num conjunto de processos, criados com "spawn" (um fork do processo do Streamlit poderia
+  copiar locks, como o do logotipo, fechados por outra thread).
+"""
+import functools
+import hashlib
+import io
+import json
+import glob
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import plotly.express as px
+import requests
+from fpdf import FPDF
+from PIL import Image
+
+import metricas
+
+logger = logging.getLogger(__name__)
+
+# --- URL DO LOGO ---
+LOGO_URL = "https://i.imgur.com/4l7Drym.png"
+DIRETORIO_CACHE = os.path.join(os.environ.get("COPSOQ_DIRETORIO_DADOS", ".copsoq_dados"), "relatorios")
+CAMINHO_LOGO_LOCAL = os.path.join(DIRETORIO_CACHE, "logo.png")
+CAMINHO_LOGO_RECURSO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recursos", "logo_copsoq.png")
+# Enquanto se usa o logotipo de recurso, a transferência é repetida no máximo uma vez neste intervalo (s)
+INTERVALO_NOVA_TENTATIVA_LOGO = 300.0
+
+_lock_logo = threading.Lock()
+_logo = None
+_proxima_tentativa_logo = float("-inf")
+
+
+def _abrir_imagem(conteudo):
+    logo = Image.open(io.BytesIO(conteudo))
+    logo.load()
+    return logo
+
+
+def _logo_transferido():
+    """O logotipo de `LOGO_URL` ou, sem rede, a última cópia transferida; None se nenhum servir."""
+    try:
+        response = requests.get(LOGO_URL, timeout=10)
+        response.raise_for_status()
+        logo = _abrir_imagem(response.content)
+        _gravar_ficheiro(CAMINHO_LOGO_LOCAL, response.content)
+        return logo
+    except Exception:
+        try:
+            with open(CAMINHO_LOGO_LOCAL, "rb") as ficheiro:
+                return _abrir_imagem(ficheiro.read())
+        except Exception:
+            logger.warning("Logotipo indisponível: sem acesso a %s e sem cópia local em %s", LOGO_URL, CAMINHO_LOGO_LOCAL)
+            return None
+
+
+@functools.lru_cache(maxsize=1)
+def _logo_recurso():
+    with open(CAMINHO_LOGO_RECURSO, "rb") as ficheiro:
+        return _abrir_imagem(ficheiro.read())
+
+
+@metricas.cronometrado()
+def obter_logo():
+    """
+    Devolve (logotipo descodificado (PIL), definitivo). Só o logotipo transferido (ou a sua
+    cópia local) é definitivo e fica guardado para o resto do processo; sem ele, devolve o de
+    recurso (ou None, se também faltar) e volta a tentar depois de `INTERVALO_NOVA_TENTATIVA_LOGO`.
+    """
+    global _logo, _proxima_tentativa_logo
+    with _lock_logo:
+        if _logo is None and time.monotonic() >= _proxima_tentativa_logo:
+            _logo = _logo_transferido()
+            if _logo is None:
+                _proxima_tentativa_logo = time.monotonic() + INTERVALO_NOVA_TENTATIVA_LOGO
+        if _logo is not None:
+            return _logo, True
+    try:
+        return _logo_recurso(), False
+    except Exception:
+        logger.warning("Logotipo de recurso indisponível em %s", CAMINHO_LOGO_RECURSO)
+        return None, False
+
+
+def _gravar_ficheiro(caminho, conteudo):
+    """Escrita atómica, para que processos em paralelo nunca leiam um ficheiro a meio."""
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as ficheiro:
+        ficheiro.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+def _ler_cache(nome):
+    try:
+        with open(os.path.join(DIRETORIO_CACHE, nome), "rb") as ficheiro:
+            return ficheiro.read()
+    except OSError:
+        return None
+
+
+def chave_dos_dados(df_medias, total_respostas, subtitulo=None):
+    """Hash dos dados agregados que entram no relatório."""
+    dados = {
+        "medias": [[escala, round(float(valor), 6)] for escala, valor in zip(df_medias["Escala"], df_medias["Pontuação Média"])],
+        "total": int(total_respostas),
+        "subtitulo": subtitulo,
+    }
+    return hashlib.sha256(json.dumps(dados, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def criar_grafico_barras(df_medias):
+    return px.bar(
+        df_medias,
+        x='Pontuação Média',
+        y='Escala',
+        orientation='h',
+        title='Pontuação Média para Cada Escala do COPSOQ III',
+        text='Pontuação Média',
+        color='Pontuação Média',
+        color_continuous_scale='RdYlGn_r'
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def _renderizar_grafico(chave, dados_json):
+    """PNG do gráfico; uma falha do kaleido propaga-se, para não ficar guardada no `lru_cache`."""
+    em_disco = _ler_cache(f"grafico_{chave}.png")
+    if em_disco is not None:
+        return em_disco
+    df_medias = pd.DataFrame(json.loads(dados_json), columns=['Escala', 'Pontuação Média'])
+    with metricas.etapa("renderizar_grafico_png"):
+        png = criar_grafico_barras(df_medias).to_image(format="png", width=1000, height=900, scale=2)
+    _gravar_ficheiro(os.path.join(DIRETORIO_CACHE, f"grafico_{chave}.png"), png)
+    return png
+
+
+def renderizar_grafico_png(df_medias):
+    """PNG do gráfico de barras das médias, ou None se o kaleido não estiver disponível."""
+    dados = [[escala, float(valor)] for escala, valor in zip(df_medias["Escala"], df_medias["Pontuação Média"])]
+    dados_json = json.dumps(dados, ensure_ascii=False)
+    chave = hashlib.sha256(dados_json.encode("utf-8")).hexdigest()
+    try:
+        return _renderizar_grafico(chave, dados_json)
+    except Exception:
+        logger.warning("Não foi possível exportar o gráfico com o kaleido; o relatório segue sem gráfico")
+        return None
+
+
+def descartar_versoes_antigas(versao_dados):
+    """
+    Apaga os relatórios e gráficos em cache se `versao_dados` (por exemplo, `CacheDeRespostas.versao()`)
+    não for a da última chamada: com os dados mudados, os ficheiros antigos já não voltam a ser pedidos.
+    """
+    versao = json.dumps(versao_dados, ensure_ascii=False)
+    marca = os.path.join(DIRETORIO_CACHE, "versao_dados.json")
+    try:
+        with open(marca, encoding="utf-8") as ficheiro:
+            if ficheiro.read() == versao:
+                return
+    except OSError:
+        pass
+    for padrao in ("relatorio_*.pdf", "grafico_*.png"):
+        for caminho in glob.glob(os.path.join(DIRETORIO_CACHE, padrao)):
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+    _renderizar_grafico.cache_clear()
+    _gravar_ficheiro(marca, versao.encode("utf-8"))
+
+
+# --- FUNÇÃO DE GERAÇÃO DE PDF ---
+class PDF(FPDF):
+    def __init__(self, logo=None):
+        super().__init__()
+        self.logo = logo
+
+    def header(self):
+        if self.logo is not None:
+            self.image(self.logo, x=10, y=8, w=35)
+            self.ln(20)
+        else:
+            self.ln(10)
+
+        self.set_font('Arial', 'B', 12)
+        self.cell(0, 10, 'Relatório de Diagnóstico Psicossocial - COPSOQ III', 0, 1, 'C')
+        self.ln(5)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Arial', 'I', 8)
+        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
+
+@metricas.cronometrado("montar_relatorio_pdf")
+def _montar_relatorio_pdf(df_medias, total_respostas, subtitulo=None, logo=None, grafico=None):
+    pdf = PDF(logo)
+    pdf.add_page()
+    pdf.set_font('Arial', 'B', 14)
+    pdf.cell(0, 10, 'Sumário dos Resultados', 0, 1, 'L')
+    if subtitulo:
+        pdf.set_font('Arial', 'I', 11)
+        pdf.cell(0, 8, subtitulo.encode('latin-1', 'replace').decode('latin-1'), 0, 1, 'L')
+    pdf.set_font('Arial', '', 12)
+    pdf.multi_cell(0, 10, f"Este relatório apresenta a média consolidada dos resultados do questionário COPSOQ III, com base num total de {total_respostas} respostas recolhidas.")
+    pdf.ln(10)
+    pdf.set_font('Arial', 'B', 12)
+    pdf.cell(0, 10, 'Tabela de Pontuações Médias por Escala', 0, 1, 'L')
+    pdf.set_font('Arial', 'B', 10)
+    col_width_escala = 130
+    col_width_pontuacao = 40
+    pdf.cell(col_width_escala, 10, 'Escala', 1, 0, 'C')
+    pdf.cell(col_width_pontuacao, 10, 'Pontuação Média', 1, 1, 'C')
+    pdf.set_font('Arial', '', 10)
+    for index, row in df_medias.iterrows():
+        pdf.cell(col_width_escala, 8, row['Escala'].encode('latin-1', 'replace').decode('latin-1'), 1, 0)
+        pdf.cell(col_width_pontuacao, 8, f"{row['Pontuação Média']:.2f}", 1, 1, 'C')
+    pdf.ln(10)
+
+    if grafico is not None:
+        pdf.add_page()
+        pdf.set_font('Arial', 'B', 12)
+        pdf.cell(0, 10, 'Gráfico das Pontuações Médias', 0, 1, 'L')
+        pdf.image(io.BytesIO(grafico), x=10, w=190)
+
+    return bytes(pdf.output())
+
+@metricas.cronometrado()
+def gerar_relatorio_pdf(df_medias, total_respostas, subtitulo=None, incluir_grafico=True):
+    """Devolve os bytes do relatório, reutilizando o PDF em cache se os dados agregados não mudaram."""
+    logo, logo_definitivo = obter_logo()
+    sufixo_logo = "" if logo_definitivo else "_logo_recurso"
+    nome = f"relatorio_{chave_dos_dados(df_medias, total_respostas, subtitulo)}_{int(incluir_grafico)}{sufixo_logo}.pdf"
+    em_cache = _ler_cache(nome)
+    if em_cache is not None:
+        return em_cache
+    grafico = renderizar_grafico_png(df_medias) if incluir_grafico else None
+    pdf_bytes = _montar_relatorio_pdf(df_medias, total_respostas, subtitulo, logo, grafico)
+    # Sem o gráfico pedido, o relatório não fica em cache: a próxima vez volta a tentar
+    if grafico is not None or not incluir_grafico:
+        _gravar_ficheiro(os.path.join(DIRETORIO_CACHE, nome), pdf_bytes)
+    return pdf_bytes
+
+
+def _configuracao():
+    return {nome: globals()[nome] for nome in ("LOGO_URL", "DIRETORIO_CACHE", "CAMINHO_LOGO_LOCAL", "CAMINHO_LOGO_RECURSO")}
+
+
+def _configurar_processo(configuracao):
+    """Os processos criados com "spawn" importam o módulo de novo: recebem os caminhos do processo principal."""
+    globals().update(configuracao)
+
+
+def _gerar_trabalho(trabalho):
+    nome, df_medias, total_respostas, subtitulo, incluir_grafico = trabalho
+    return nome, gerar_relatorio_pdf(df_medias, total_respostas, subtitulo, incluir_grafico)
+
+
+def gerar_relatorios_em_lote(trabalhos, max_processos=None, incluir_grafico=True):
+    """
+    Gera vários relatórios em paralelo. `trabalhos` é uma lista de tuplos
+    (nome, df_medias, total_respostas, subtitulo); devolve {nome: bytes do PDF}.
+    """
+    trabalhos = [(*trabalho, incluir_grafico) for trabalho in trabalhos]
+    if len(trabalhos) <= 1:
+        return dict(_gerar_trabalho(trabalho) for trabalho in trabalhos)
+    with ProcessPoolExecutor(
+        max_workers=max_processos,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_configurar_processo,
+        initargs=(_configuracao(),),
+    ) as executor:
+        return dict(executor.map(_gerar_trabalho, trabalhos))
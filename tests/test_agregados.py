@@ -0,0 +1,60 @@
+"""Agregados por escala: junção de partições e reconstrução a partir das linhas da planilha."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import calculadora_copsoq as motor
+import codec_respostas as codec
+from agregados import AgregadosEscalas
+from cache_respostas import CacheDeRespostas
+from planilha_falsa import WorksheetFalsa
+
+OPCOES = ["Nunca", "Raramente", "Às vezes", "Frequentemente", "Sempre", None]
+
+
+def linhas_da_planilha(n, semente=0):
+    """Linhas como a planilha as devolve (texto), alternando o formato compacto e o largo."""
+    gerador = np.random.default_rng(semente)
+    linhas = []
+    for i in range(n):
+        respostas = [OPCOES[j] for j in gerador.integers(0, len(OPCOES), motor.TOTAL_PERGUNTAS)]
+        resultados = motor.calcular_escalas_finais(motor.calcular_pontuacoes(respostas))
+        timestamp = f"2026-0{1 + i % 9}-{1 + i % 28:02d} 10:00:00"
+        if i % 2:
+            linha = [timestamp] + respostas + [resultados[nome] for nome in motor.definicao_escalas] + [f"id-{i}"]
+        else:
+            linha = codec.codificar_linha(timestamp, respostas, resultados) + [f"id-{i}"]
+        linhas.append(["" if valor is None else str(valor) for valor in linha])
+    return linhas
+
+
+def test_mesclar_particoes_e_igual_a_calcular_tudo_de_uma_vez():
+    matriz = np.random.default_rng(1).integers(0, 10001, (500, len(motor.definicao_escalas))) / 100
+    matriz[np.random.default_rng(2).random(matriz.shape) < 0.1] = np.nan
+    juntos = AgregadosEscalas.de_matriz(matriz)
+    por_partes = AgregadosEscalas()
+    for parte in np.array_split(matriz, 7):
+        por_partes.mesclar(AgregadosEscalas.de_matriz(parte))
+
+    pd.testing.assert_frame_equal(por_partes.resumo(), juntos.resumo())
+    esperado = pd.DataFrame(matriz, columns=list(motor.definicao_escalas))
+    resumo = juntos.resumo().set_index("Escala")
+    np.testing.assert_allclose(resumo["Pontuação Média"], esperado.mean()[resumo.index])
+    np.testing.assert_allclose(resumo["Desvio Padrão"], esperado.std()[resumo.index])
+    np.testing.assert_allclose(resumo["Mediana"], esperado.median()[resumo.index])
+    np.testing.assert_allclose(resumo["Q1"], esperado.quantile(0.25)[resumo.index])
+
+
+@pytest.mark.parametrize("lotes", [1, 4])
+def test_cache_reconstroi_os_agregados_da_planilha(tmp_path, lotes):
+    linhas = linhas_da_planilha(60)
+    folha = WorksheetFalsa()
+    folha.carregar_valores([codec.cabecalho_compacto])
+    cache = CacheDeRespostas(str(tmp_path / "cache.sqlite3"))
+    for parte in np.array_split(np.arange(len(linhas)), lotes):
+        folha.append_rows([linhas[i] for i in parte])
+        cache.sincronizar(folha)
+
+    esperado = AgregadosEscalas.de_matriz(codec.descodificar_linhas(linhas)["escalas"])
+    pd.testing.assert_frame_equal(cache.agregados().resumo(), esperado.resumo())
+    assert cache.agregados().total_linhas == len(linhas)
@@ -0,0 +1,89 @@
+"""Sincronização do cache local com uma `planilha_falsa.WorksheetFalsa`."""
+import threading
+
+import calculadora_copsoq as motor
+import codec_respostas as codec
+from cache_respostas import CacheDeRespostas
+from planilha_falsa import WorksheetFalsa
+
+
+def linha_compacta(i):
+    respostas = ["Frequentemente"] * motor.TOTAL_PERGUNTAS
+    resultados = motor.calcular_escalas_finais(motor.calcular_pontuacoes(respostas))
+    return codec.codificar_linha(f"2026-10-{1 + i % 28:02d} 10:00:00", respostas, resultados) + [f"id-{i}"]
+
+
+def nova_folha(n):
+    folha = WorksheetFalsa()
+    folha.carregar_valores([codec.cabecalho_compacto] + [[str(v) for v in linha_compacta(i)] for i in range(n)])
+    return folha
+
+
+class WorksheetLenta(WorksheetFalsa):
+    """O `get` só termina quando `continuar` for assinalado, como uma leitura lenta da API."""
+
+    def __init__(self, folha):
+        super().__init__()
+        self.carregar_valores(folha.get_all_values())
+        self.a_ler = threading.Event()
+        self.continuar = threading.Event()
+
+    def get(self, range_name=None, **kwargs):
+        self.a_ler.set()
+        self.continuar.wait(5)
+        return super().get(range_name, **kwargs)
+
+
+def test_sincronizacao_incremental(tmp_path):
+    folha = nova_folha(3)
+    cache = CacheDeRespostas(str(tmp_path / "cache.sqlite3"))
+    assert len(cache.sincronizar(folha)["ids"]) == 3
+
+    folha.append_rows([linha_compacta(i) for i in range(3, 5)])
+    assert cache.sincronizar(folha)["ids"] == ["id-3", "id-4"]
+    assert cache.sincronizar(folha) == []
+    assert cache.total_respostas() == 5
+
+
+def test_consultas_nao_esperam_pela_leitura_da_planilha(tmp_path):
+    cache = CacheDeRespostas(str(tmp_path / "cache.sqlite3"))
+    cache.sincronizar(nova_folha(2))
+    folha = WorksheetLenta(nova_folha(4))
+
+    sincronizacao = threading.Thread(target=cache.sincronizar, args=(folha,))
+    sincronizacao.start()
+    assert folha.a_ler.wait(5)
+    consultas = threading.Thread(target=lambda: (cache.agregados(), cache.versao(), cache.totais_periodo(), cache.intervalo_datas()))
+    consultas.start()
+    consultas.join(2)
+    assert not consultas.is_alive(), "as consultas ficaram à espera da leitura da planilha"
+    assert cache.total_respostas() == 2
+
+    folha.continuar.set()
+    sincronizacao.join(5)
+    assert cache.total_respostas() == 4
+
+
+def test_leitura_de_outra_instancia_nao_duplica_linhas(tmp_path):
+    caminho = str(tmp_path / "cache.sqlite3")
+    primeira, segunda = CacheDeRespostas(caminho), CacheDeRespostas(caminho)
+    folha = WorksheetLenta(nova_folha(3))
+
+    sincronizacao = threading.Thread(target=primeira.sincronizar, args=(folha,))
+    sincronizacao.start()
+    assert folha.a_ler.wait(5)
+    # Enquanto a primeira lê, a segunda instância sincroniza o mesmo ficheiro
+    segunda.sincronizar(nova_folha(3))
+    folha.continuar.set()
+    sincronizacao.join(5)
+
+    assert primeira.total_respostas() == 3
+    assert CacheDeRespostas(caminho).agregados().total_linhas == 3
+    assert primeira.sincronizar(nova_folha(3)) == []
+
+
+def test_linhas_apagadas_na_planilha_reconstroem_o_cache(tmp_path):
+    cache = CacheDeRespostas(str(tmp_path / "cache.sqlite3"))
+    cache.sincronizar(nova_folha(5))
+    assert cache.sincronizar(nova_folha(3))["ids"] == ["id-0", "id-1", "id-2"]
+    assert cache.total_respostas() == 3
@@ -0,0 +1,170 @@
+"""Envio da fila de submissões para uma `planilha_falsa.WorksheetFalsa`: cabeçalho, repetição após falha e agrupamento."""
+import threading
+import time
+
+import pytest
+
+import calculadora_copsoq as motor
+import codec_respostas as codec
+import fila_submissoes
+from fila_submissoes import NUMERO_COLUNA_ID, FilaDeSubmissoes, garantir_cabecalho
+from planilha_falsa import WorksheetFalsa
+
+
+def linha_compacta(i):
+    respostas = ["Às vezes"] * motor.TOTAL_PERGUNTAS
+    resultados = motor.calcular_escalas_finais(motor.calcular_pontuacoes(respostas))
+    return codec.codificar_linha(f"2026-10-18 10:00:{i:02d}", respostas, resultados)
+
+
+class WorksheetQueFalha(WorksheetFalsa):
+    """Grava as primeiras `gravar` linhas do próximo `append_rows` e depois falha, como uma resposta perdida da API."""
+
+    def __init__(self, gravar):
+        super().__init__()
+        self.gravar = gravar
+
+    def append_rows(self, values, **kwargs):
+        if self.gravar is None:
+            return super().append_rows(values, **kwargs)
+        gravar, self.gravar = self.gravar, None
+        super().append_rows(values[:gravar], **kwargs)
+        raise ConnectionError("ligação perdida")
+
+
+@pytest.fixture
+def fila(tmp_path):
+    fila = FilaDeSubmissoes(str(tmp_path / "fila.sqlite3"), espera_inicial=0.01, espera_agrupamento=0.3, intervalo_minimo=0.0)
+    yield fila
+    fila.parar(5)
+
+
+def ids_na_folha(worksheet):
+    return worksheet.col_values(NUMERO_COLUNA_ID)[1:]
+
+
+def esperar_fila_vazia(fila, tempo_limite=5.0):
+    limite = time.monotonic() + tempo_limite
+    while fila.total_pendentes() and time.monotonic() < limite:
+        time.sleep(0.02)
+    assert fila.total_pendentes() == 0
+
+
+def test_cabecalho_criado_em_folha_vazia(fila):
+    worksheet = WorksheetFalsa()
+    id_submissao = fila.enfileirar(linha_compacta(0))
+    fila.iniciar_descarregador(lambda fragmento: worksheet)
+    esperar_fila_vazia(fila)
+
+    assert worksheet.row_values(1) == codec.cabecalho_compacto
+    assert ids_na_folha(worksheet) == [id_submissao]
+
+
+def test_cabecalho_existente_nao_e_reescrito():
+    worksheet = WorksheetFalsa()
+    worksheet.carregar_valores([motor.cabecalho_planilha])
+    garantir_cabecalho(worksheet)
+    assert worksheet.row_values(1) == motor.cabecalho_planilha
+    assert "update" not in worksheet.chamadas
+
+
+@pytest.mark.parametrize("gravadas_antes_da_falha", [0, 2, 5])
+def test_repeticao_apos_falha_parcial_nao_duplica(fila, gravadas_antes_da_falha):
+    worksheet = WorksheetQueFalha(gravadas_antes_da_falha)
+    garantir_cabecalho(worksheet)
+    ids = [fila.enfileirar(linha_compacta(i)) for i in range(5)]
+
+    with pytest.raises(ConnectionError):
+        fila.descarregar(worksheet)
+    assert fila.total_pendentes() == 5
+
+    # Na repetição, os IDs já na folha (coluna ID_Submissao) saem da fila sem novo envio
+    fila.descarregar(worksheet)
+    assert fila.total_pendentes() == 0
+    assert ids_na_folha(worksheet) == ids
+    assert worksheet.chamadas["col_values"] >= 1
+
+
+def test_repeticao_sem_linhas_em_falta_nao_volta_a_enviar(fila):
+    worksheet = WorksheetQueFalha(3)
+    garantir_cabecalho(worksheet)
+    ids = [fila.enfileirar(linha_compacta(i)) for i in range(3)]
+    with pytest.raises(ConnectionError):
+        fila.descarregar(worksheet)
+
+    assert fila.descarregar(worksheet) == 0
+    assert worksheet.chamadas["append_rows"] == 1
+    assert ids_na_folha(worksheet) == ids
+
+
+def test_descarregador_repete_apos_falha(fila):
+    worksheet = WorksheetQueFalha(1)
+    garantir_cabecalho(worksheet)
+    ids = [fila.enfileirar(linha_compacta(i)) for i in range(4)]
+    fila.iniciar_descarregador(lambda fragmento: worksheet)
+    esperar_fila_vazia(fila)
+
+    assert ids_na_folha(worksheet) == ids
+
+
+def test_submissoes_em_rajada_seguem_num_so_envio(fila):
+    worksheet = WorksheetFalsa()
+    fila.iniciar_descarregador(lambda fragmento: worksheet)
+    ids = []
+    for i in range(10):
+        ids.append(fila.enfileirar(linha_compacta(i)))
+        time.sleep(0.01)
+    esperar_fila_vazia(fila)
+
+    assert worksheet.chamadas["append_rows"] == 1
+    assert ids_na_folha(worksheet) == ids
+
+
+class WorksheetLenta(WorksheetFalsa):
+    """O `append_rows` só termina quando `continuar` for assinalado, como um pedido lento à API."""
+
+    def __init__(self):
+        super().__init__()
+        self.a_enviar = threading.Event()
+        self.continuar = threading.Event()
+
+    def append_rows(self, values, **kwargs):
+        self.a_enviar.set()
+        self.continuar.wait(5)
+        return super().append_rows(values, **kwargs)
+
+
+def test_duas_filas_no_mesmo_ficheiro_nao_enviam_o_mesmo_lote(tmp_path):
+    caminho = str(tmp_path / "fila.sqlite3")
+    primeira, segunda = FilaDeSubmissoes(caminho), FilaDeSubmissoes(caminho)
+    worksheet = WorksheetLenta()
+    garantir_cabecalho(worksheet)
+    ids = [primeira.enfileirar(linha_compacta(i)) for i in range(3)]
+
+    envio = threading.Thread(target=primeira.descarregar, args=(worksheet,))
+    envio.start()
+    assert worksheet.a_enviar.wait(5)
+    # O lote está reservado pela primeira instância enquanto o envio decorre
+    assert segunda.descarregar(worksheet) == 0
+    worksheet.continuar.set()
+    envio.join(5)
+
+    assert segunda.descarregar(worksheet) == 0
+    assert ids_na_folha(worksheet) == ids
+    assert segunda.total_pendentes() == 0
+
+
+def test_reserva_de_instancia_que_morreu_caduca(tmp_path, monkeypatch):
+    monkeypatch.setattr(fila_submissoes, "PRAZO_RESERVA", 0.05)
+    caminho = str(tmp_path / "fila.sqlite3")
+    primeira, segunda = FilaDeSubmissoes(caminho), FilaDeSubmissoes(caminho)
+    worksheet = WorksheetFalsa()
+    garantir_cabecalho(worksheet)
+    ids = [primeira.enfileirar(linha_compacta(i)) for i in range(3)]
+    # A primeira instância reserva o lote e morre antes de o enviar
+    primeira._reservar_lote("")
+
+    assert segunda.descarregar(worksheet) == 0
+    time.sleep(0.1)
+    assert segunda.descarregar(worksheet) == 3
+    assert ids_na_folha(worksheet) == ids
@@ -0,0 +1,143 @@
+"""Migração do formato largo para o compacto: ida e volta das linhas, lotes e escritas concorrentes."""
+import random
+
+import numpy as np
+import pytest
+
+import calculadora_copsoq as motor
+import codec_respostas as codec
+from migrar_planilha import migrar_worksheet
+from planilha_falsa import ClienteFalso
+
+OPCOES = ["Nunca", "Raramente", "Às vezes", "Frequentemente", "Sempre", None]
+
+
+def respostas_aleatorias(gerador):
+    return [gerador.choice(OPCOES) for _ in range(motor.TOTAL_PERGUNTAS)]
+
+
+def linha_larga(i, gerador, com_id=True):
+    """Linha como a aplicação original a escrevia: 84 respostas e 31 escalas em texto."""
+    respostas = respostas_aleatorias(gerador)
+    resultados = motor.calcular_escalas_finais(motor.calcular_pontuacoes(respostas))
+    linha = [f"2026-03-{1 + i % 28:02d} 10:00:00"] + respostas + [resultados[nome] for nome in motor.definicao_escalas]
+    if com_id:
+        linha.append(f"larga-{i}")
+    return [codec.formatar_celula(valor) for valor in linha]
+
+
+def linha_compacta(i, gerador):
+    respostas = respostas_aleatorias(gerador)
+    resultados = motor.calcular_escalas_finais(motor.calcular_pontuacoes(respostas))
+    return [codec.formatar_celula(valor) for valor in codec.codificar_linha(f"2026-04-{1 + i % 28:02d} 09:30:00", respostas, resultados) + [f"compacta-{i}"]]
+
+
+def nova_folha(linhas, cabecalho=motor.cabecalho_planilha):
+    folha = ClienteFalso("Resultados_COPSOQ").open("Resultados_COPSOQ").sheet1
+    folha.carregar_valores([list(cabecalho)] + linhas)
+    return folha
+
+
+def assert_mesmos_dados(antes, depois):
+    """As linhas descodificadas dos dois lados têm os mesmos Timestamps, respostas, escalas (ao centésimo) e IDs."""
+    a, b = codec.descodificar_linhas(antes), codec.descodificar_linhas(depois)
+    assert a["timestamps"] == b["timestamps"]
+    assert a["ids"] == b["ids"]
+    np.testing.assert_array_equal(a["codigos"], b["codigos"])
+    np.testing.assert_allclose(a["escalas"], b["escalas"], atol=0.005)
+
+
+@pytest.fixture
+def gerador():
+    return random.Random(0)
+
+
+def test_linhas_largas(gerador):
+    linhas = [linha_larga(i, gerador) for i in range(25)] + [linha_larga(25, gerador, com_id=False)]
+    folha = nova_folha(linhas)
+
+    resumo = migrar_worksheet(folha, tamanho_lote=7, criar_copia=False)
+
+    valores = folha.get_all_values()
+    assert valores[0] == codec.cabecalho_compacto
+    assert all(len(linha) == len(codec.cabecalho_compacto) and codec.eh_linha_compacta(linha) for linha in valores[1:])
+    assert_mesmos_dados(linhas, valores[1:])
+    assert resumo["linhas"] == 26 and resumo["ja_compactas"] == 0
+    assert resumo["caracteres_depois"] < resumo["caracteres_antes"]
+
+
+def test_linhas_compactas_ficam_iguais(gerador):
+    linhas = [linha_compacta(i, gerador) for i in range(10)]
+    folha = nova_folha(linhas, codec.cabecalho_compacto)
+
+    resumo = migrar_worksheet(folha, criar_copia=False)
+
+    assert folha.get_all_values()[1:] == linhas
+    assert resumo["ja_compactas"] == 10
+
+
+def test_linhas_mistas_e_vazias(gerador):
+    vazia = [""] * len(motor.cabecalho_planilha)
+    linhas = [linha_larga(0, gerador), linha_compacta(1, gerador), vazia, linha_larga(3, gerador), linha_compacta(4, gerador)]
+    folha = nova_folha(linhas)
+
+    resumo = migrar_worksheet(folha, tamanho_lote=2)
+
+    valores = folha.get_all_values()
+    # As linhas ficam no mesmo sítio e a vazia continua vazia
+    assert not any(valores[3])
+    cheias = [linha for linha in linhas if any(linha)]
+    assert_mesmos_dados(cheias, [linha for linha in valores[1:] if any(linha)])
+    assert resumo["linhas"] == 4 and resumo["ja_compactas"] == 2
+    # A cópia guarda a folha original
+    copia = folha.spreadsheet.worksheet(resumo["copia"])
+    assert copia.get_all_values()[1:] == [linha + [""] * (len(motor.cabecalho_planilha) - len(linha)) for linha in linhas]
+
+
+class FolhaComEscritasConcorrentes:
+    """Envolve uma folha falsa: a aplicação acrescenta uma linha antes de cada `update` e o `update` número `falhar_em` falha."""
+
+    def __init__(self, folha, linhas_novas, falhar_em=None):
+        self._folha = folha
+        self._linhas_novas = list(linhas_novas)
+        self._falhar_em = falhar_em
+        self._updates = 0
+
+    def __getattr__(self, nome):
+        return getattr(self._folha, nome)
+
+    def update(self, values=None, range_name=None, **kwargs):
+        if self._linhas_novas:
+            self._folha.append_rows([self._linhas_novas.pop(0)])
+        self._updates += 1
+        if self._updates == self._falhar_em:
+            raise ConnectionError("ligação perdida")
+        return self._folha.update(values=values, range_name=range_name, **kwargs)
+
+
+def test_linhas_acrescentadas_durante_a_migracao_ficam(gerador):
+    linhas = [linha_larga(i, gerador) for i in range(6)]
+    novas = [linha_compacta(100 + i, gerador) for i in range(3)]
+    folha = nova_folha(linhas)
+
+    migrar_worksheet(FolhaComEscritasConcorrentes(folha, novas), tamanho_lote=2, criar_copia=False)
+
+    valores = folha.get_all_values()
+    assert_mesmos_dados(linhas + novas, valores[1:])
+    assert valores[-3:] == novas
+
+
+def test_falha_a_meio_deixa_a_folha_legivel_e_pode_ser_repetida(gerador):
+    linhas = [linha_larga(i, gerador) for i in range(6)]
+    folha = nova_folha(linhas)
+
+    with pytest.raises(ConnectionError):
+        migrar_worksheet(FolhaComEscritasConcorrentes(folha, [], falhar_em=2), tamanho_lote=2, criar_copia=False)
+    valores = folha.get_all_values()
+    assert sum(codec.eh_linha_compacta(linha) for linha in valores[1:]) == 2
+    assert_mesmos_dados(linhas, valores[1:])
+
+    resumo = migrar_worksheet(folha, tamanho_lote=2, criar_copia=False)
+    assert resumo["ja_compactas"] == 2
+    assert_mesmos_dados(linhas, folha.get_all_values()[1:])
+    assert folha.get_all_values()[0] == codec.cabecalho_compacto
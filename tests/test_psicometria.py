@@ -0,0 +1,70 @@
+"""Análise psicométrica em segundo plano: cache em disco e tratamento de erros."""
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import psicometria
+
+
+@pytest.fixture(autouse=True)
+def diretorio_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(psicometria, "DIRETORIO_CACHE", str(tmp_path))
+    monkeypatch.setattr(psicometria, "_em_curso", {})
+    monkeypatch.setattr(psicometria, "_falhas", {})
+    return tmp_path
+
+
+def codigos(n=30):
+    return np.random.default_rng(0).integers(0, 5, (n, 84))
+
+
+def analisar_numa_thread(*argumentos, **opcoes):
+    """Chama `analise_em_segundo_plano` numa thread, para um bloqueio não parar os testes."""
+    resultado = {}
+    thread = threading.Thread(target=lambda: resultado.setdefault("futuro", psicometria.analise_em_segundo_plano(*argumentos, **opcoes)), daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive(), "analise_em_segundo_plano ficou bloqueada"
+    return resultado["futuro"]
+
+
+def test_erro_e_mostrado_sem_repetir_o_calculo():
+    chamadas = []
+
+    def carregar():
+        chamadas.append(1)
+        raise MemoryError("sem memória")
+
+    futuro = analisar_numa_thread("v1", carregar, reamostragens=50)
+    assert isinstance(futuro.exception(10), MemoryError)
+    for _ in range(3):
+        # Já concluído com erro: o callback corre na própria chamada e não pode bloquear
+        assert analisar_numa_thread("v1", carregar, reamostragens=50) is futuro
+    assert len(chamadas) == 1
+
+
+def test_erro_volta_a_ser_calculado_depois_da_espera(monkeypatch):
+    respostas = iter([MemoryError("sem memória"), codigos()])
+
+    def carregar():
+        valor = next(respostas)
+        if isinstance(valor, Exception):
+            raise valor
+        return valor
+
+    futuro = analisar_numa_thread("v1", carregar, reamostragens=50)
+    assert futuro.exception(10) is not None
+    monkeypatch.setattr(psicometria, "ESPERA_APOS_ERRO", 0.0)
+    resultado = analisar_numa_thread("v1", carregar, reamostragens=50).result(30)
+    assert resultado["total_respostas"] == 30
+
+
+def test_so_fica_em_disco_a_versao_mais_recente(diretorio_cache):
+    for versao in ("v1", "v2"):
+        psicometria.analise_em_segundo_plano(versao, codigos, reamostragens=50).result(30)
+    assert os.listdir(diretorio_cache) == [f"analise_{psicometria.chave_da_analise('v2', 50)}.json"]
+    # Já em disco: o Future vem concluído, sem voltar a carregar os dados
+    futuro = psicometria.analise_em_segundo_plano("v2", lambda: pytest.fail("não devia recalcular"), reamostragens=50)
+    assert futuro.done() and futuro.result()["total_respostas"] == 30
@@ -0,0 +1,43 @@
+"""Relatórios PDF gerados em lote num conjunto de processos."""
+import os
+
+import pandas as pd
+import pytest
+
+import relatorio_pdf
+
+
+@pytest.fixture
+def diretorio_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(relatorio_pdf, "DIRETORIO_CACHE", str(tmp_path))
+    monkeypatch.setattr(relatorio_pdf, "CAMINHO_LOGO_LOCAL", str(tmp_path / "logo.png"))
+    # Porta fechada: sem rede, os relatórios usam o logotipo de recurso
+    monkeypatch.setattr(relatorio_pdf, "LOGO_URL", "http://127.0.0.1:9/logo.png")
+    return tmp_path
+
+
+def medias(deslocamento):
+    return pd.DataFrame({"Escala": ["Ritmo de Trabalho", "Exigências Cognitivas"], "Pontuação Média": [40.0 + deslocamento, 70.0]})
+
+
+def test_lote_em_processos_spawn(diretorio_cache, monkeypatch):
+    contextos = []
+    executor_original = relatorio_pdf.ProcessPoolExecutor
+
+    def executor_espiao(*args, **kwargs):
+        contextos.append(kwargs.get("mp_context"))
+        return executor_original(*args, **kwargs)
+
+    monkeypatch.setattr(relatorio_pdf, "ProcessPoolExecutor", executor_espiao)
+    trabalhos = [(f"campanha {i}", medias(i), 10 + i, f"Campanha {i}") for i in range(3)]
+
+    relatorios = relatorio_pdf.gerar_relatorios_em_lote(trabalhos, max_processos=2, incluir_grafico=False)
+
+    assert [contexto.get_start_method() for contexto in contextos] == ["spawn"]
+    assert sorted(relatorios) == ["campanha 0", "campanha 1", "campanha 2"]
+    assert all(pdf.startswith(b"%PDF") for pdf in relatorios.values())
+    # Os processos usam o diretório de cache do processo principal
+    gravados = sorted(nome for nome in os.listdir(diretorio_cache) if nome.startswith("relatorio_"))
+    assert len(gravados) == 3 and all(nome.endswith("_0_logo_recurso.pdf") for nome in gravados)
+    # E o lote seguinte vem da cache
+    assert relatorio_pdf.gerar_relatorio_pdf(medias(1), 11, "Campanha 1", incluir_grafico=False) == relatorios["campanha 1"]